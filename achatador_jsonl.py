@@ -0,0 +1,119 @@
+import codecs
+import json
+import os
+
+def achatar(valor, prefixo="", destino=None):
+    """Achata um registro JSON em {coluna: valor}, com qualquer profundidade.
+
+    Dicionários viram `pai.filho`. Listas de leituras no formato
+    `{tipo: [{"value": v, "sensorId": id}]}` viram uma coluna por sensor
+    (`tipo.id`); se a leitura tiver outros campos (min/max/mean das janelas),
+    um por campo (`tipo.id.min`). Outras listas usam o índice (`pai.0`).
+    """
+    if destino is None:
+        destino = {}
+    if isinstance(valor, dict):
+        for chave, subvalor in valor.items():
+            achatar(subvalor, f"{prefixo}.{chave}" if prefixo else str(chave), destino)
+    elif isinstance(valor, list):
+        for indice, item in enumerate(valor):
+            if isinstance(item, dict) and "sensorId" in item:
+                nome = f"{prefixo}.{item['sensorId']}"
+                campos = {chave: subvalor for chave, subvalor in item.items() if chave != "sensorId"}
+                if list(campos) == ["value"]:
+                    destino[nome] = campos["value"]
+                else:
+                    achatar(campos, nome, destino)
+            else:
+                achatar(item, f"{prefixo}.{indice}", destino)
+    else:
+        destino[prefixo or "valor"] = valor
+    return destino
+
+def linhas_jsonl(partes, codificacao="utf-8"):
+    """Gera as linhas de um JSONL que chega em pedaços de bytes, sem juntar o arquivo.
+
+    Aceita também o conteúdo inteiro (str ou bytes). Um caractere UTF-8
+    partido entre dois pedaços é remontado pelo decoder incremental.
+    """
+    if isinstance(partes, (str, bytes)):
+        partes = [partes]
+    decoder = codecs.getincrementaldecoder(codificacao)()
+    resto = ""
+    for parte in partes:
+        texto = resto + (parte if isinstance(parte, str) else decoder.decode(parte))
+        linhas = texto.split("\n")
+        resto = linhas.pop()
+        yield from linhas
+    resto += decoder.decode(b"", final=True)
+    if resto:
+        yield resto
+
+class EsquemaColunas:
+    """Colunas da aba, em ordem; só cresce, para as linhas já enviadas continuarem alinhadas.
+
+    Chaves novas vão para o fim. Com `caminho`, o esquema é salvo em JSON e
+    recarregado no próximo início, mantendo a mesma ordem de colunas.
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho
+        self.colunas = []
+        if caminho and os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                self.colunas = json.load(f)["colunas"]
+        self.indice = {coluna: i for i, coluna in enumerate(self.colunas)}
+        self.alterado = False
+
+    def linha(self, registro):
+        """Linha alinhada com as colunas; alarga o esquema se `registro` tiver chaves novas."""
+        for coluna in registro:
+            if coluna not in self.indice:
+                self.indice[coluna] = len(self.colunas)
+                self.colunas.append(coluna)
+                self.alterado = True
+        linha = [""] * len(self.colunas)
+        for coluna, valor in registro.items():
+            linha[self.indice[coluna]] = "" if valor is None else valor
+        return linha
+
+    def salvar(self):
+        if not self.caminho or not self.alterado:
+            return
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"colunas": self.colunas}, f, ensure_ascii=False)
+        os.replace(temporario, self.caminho)
+        self.alterado = False
+
+class AchatadorJSONL:
+    """Lê um JSONL linha a linha e entrega as linhas achatadas em blocos de `tamanho_bloco`.
+
+    A memória fica em um bloco, qualquer que seja o tamanho do arquivo.
+    Linhas com JSON inválido são puladas e contadas em `invalidas`.
+    """
+
+    def __init__(self, esquema, tamanho_bloco=1000):
+        self.esquema = esquema
+        self.tamanho_bloco = tamanho_bloco
+        self.linhas = 0
+        self.invalidas = 0
+
+    def blocos(self, partes):
+        bloco = []
+        for numero, texto in enumerate(linhas_jsonl(partes), start=1):
+            if not texto.strip():
+                continue
+            try:
+                registro = json.loads(texto)
+            except json.JSONDecodeError as e:
+                self.invalidas += 1
+                print(f"Erro ao decodificar JSON na linha {numero}: {e}")
+                continue
+            bloco.append(self.esquema.linha(achatar(registro)))
+            self.linhas += 1
+            if len(bloco) >= self.tamanho_bloco:
+                yield bloco
+                bloco = []
+        if bloco:
+            yield bloco
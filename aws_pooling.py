@@ -1,8 +1,14 @@
+import os
 import time
 import boto3
+from botocore.config import Config
 import gspread
-import json
 from google.oauth2.service_account import Credentials
+from listagem_s3 import ListagemIncremental
+from eventos_s3 import consumir_eventos, criar_cliente_sqs
+from escritor_sheets import EscritorSheets, FilaSheets, abrir_aba_gspread
+from achatador_jsonl import AchatadorJSONL, EsquemaColunas
+from busca_s3 import BuscaConcorrente
 
 AWS_ACCESS_KEY_ID = 'leandro'
 AWS_SECRET_ACCESS_KEY = 'leandro'
@@ -11,6 +17,23 @@ AWS_SESSION_TOKEN = 'leandro'
 BUCKET_NAME = 'eco-fire-watch'
 PREFIX = ''
 POLL_INTERVAL = 60
+ARQUIVO_ESTADO = 'aws_pooling_estado.sqlite3'
+VARREDURA_A_CADA = 60
+# Com a URL de uma fila SQS que recebe os eventos ObjectCreated do bucket,
+# roda no modo por eventos; a listagem vira varredura de reconciliação
+FILA_EVENTOS_URL = os.environ.get('FILA_EVENTOS_URL', '')
+INTERVALO_RECONCILIACAO = 900
+# Mensagens que falham MAX_RECEBIMENTOS vezes vão para esta fila (ou são descartadas)
+FILA_FALHAS_URL = os.environ.get('FILA_FALHAS_URL')
+MAX_RECEBIMENTOS = 5
+# Escritas no Sheets passam por uma fila compartilhada entre os pollers
+ARQUIVO_FILA_SHEETS = os.environ.get('FILA_SHEETS', 'fila_sheets.sqlite3')
+# Colunas conhecidas da aba (só crescem) e linhas por envio à fila
+ARQUIVO_ESQUEMA = 'aws_pooling_esquema.json'
+LINHAS_POR_BLOCO = 1000
+# Recuperação de atraso: downloads em paralelo com teto de memória
+DOWNLOADS_SIMULTANEOS = 8
+LIMITE_BYTES_EM_MEMORIA = 64 * 1024 * 1024
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 SERVICE_ACCOUNT_FILE = r'main_repository\ecofirewatch-0089310b8142.json'
@@ -19,77 +42,105 @@ WORKSHEET_NAME = 'Sensor'
 
 credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
 gc = gspread.authorize(credentials)
-sheet = gc.open_by_key(SPREADSHEET_ID).worksheet(WORKSHEET_NAME)
+fila_sheets = FilaSheets(ARQUIVO_FILA_SHEETS)
+escritor_sheets = EscritorSheets(fila_sheets, abrir_aba_gspread(gc))
+esquema = EsquemaColunas(ARQUIVO_ESQUEMA)
 
 s3 = boto3.client(
     's3',
     aws_access_key_id=AWS_ACCESS_KEY_ID,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    aws_session_token=AWS_SESSION_TOKEN
+    aws_session_token=AWS_SESSION_TOKEN,
+    config=Config(max_pool_connections=DOWNLOADS_SIMULTANEOS)
 )
 
 def listar_arquivos_s3():
-    response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=PREFIX)
-    if 'Contents' in response:
-        return [obj['Key'] for obj in response['Contents']]
-    return []
+    # Pagina até o fim: list_objects_v2 devolve no máximo 1000 chaves por chamada
+    paginas = s3.get_paginator('list_objects_v2').paginate(Bucket=BUCKET_NAME, Prefix=PREFIX)
+    return [obj['Key'] for pagina in paginas for obj in pagina.get('Contents', [])]
 
-def baixar_arquivo_s3(key):
+def baixar_partes_s3(key):
     response = s3.get_object(Bucket=BUCKET_NAME, Key=key)
-    return response['Body'].read().decode('utf-8')
-
-def achatar_json(dado):
-    resultado = {}
-    for chave, valor in dado.items():
-        if isinstance(valor, dict):
-            for subchave, subvalor in valor.items():
-                nova_chave = f"{chave}.{subchave}"
-                resultado[nova_chave] = subvalor
-        else:
-            resultado[chave] = valor
-    return resultado
-
-def processar_json_e_enviar_para_sheets(conteudo_arquivo):
-    try:
-        linhas_json = conteudo_arquivo.strip().split('\n')
-        dados_raw = [json.loads(linha) for linha in linhas_json if linha.strip()]
-        
-        if not dados_raw:
-            print("Nenhum dado JSON encontrado.")
-            return
-
-        dados = [achatar_json(dado) for dado in dados_raw]
-
-        headers = list(dados[0].keys())
-        linhas = [[item.get(h, '') for h in headers] for item in dados]
-
-        sheet.clear()
-        sheet.update('A1', [headers] + linhas)
-
-        print("Dados JSONL enviados com sucesso ao Google Sheets.")
-
-    except json.JSONDecodeError as e:
-        print(f"Erro ao decodificar JSON: {e}")
-    except Exception as e:
-        print(f"Erro ao enviar para o Sheets: {e}")
+    return response['Body'].iter_chunks(1024 * 1024)
+
+def processar_json_e_enviar_para_sheets(partes):
+    # `partes`: pedaços de bytes do arquivo (ou o conteúdo inteiro); lido linha a linha.
+    # Linhas com JSON inválido são puladas pelo achatador; erros de download,
+    # leitura ou da fila sobem, e nesse caso nenhuma linha do arquivo é enfileirada
+    achatador = AchatadorJSONL(esquema, LINHAS_POR_BLOCO)
+    with fila_sheets.transacao():
+        for bloco in achatador.blocos(partes):
+            # Só acrescenta as linhas novas; o cabeçalho acompanha o esquema, que só cresce
+            fila_sheets.anexar(SPREADSHEET_ID, WORKSHEET_NAME, bloco, cabecalho=esquema.colunas)
+    esquema.salvar()
+
+    if not achatador.linhas:
+        print("Nenhum dado JSON encontrado.")
+        return
+    print(f"{achatador.linhas} linhas JSONL enfileiradas para o Google Sheets"
+          f" ({len(esquema.colunas)} colunas, {achatador.invalidas} linhas inválidas).")
+
+def processar_arquivo(listagem, arquivo, partes=None):
+    print(f'Novo arquivo detectado: {arquivo}')
+    if partes is None:
+        partes = baixar_partes_s3(arquivo)
+    # Só marca depois de ler o arquivo inteiro e enfileirar; se falhar, ele volta na próxima listagem
+    processar_json_e_enviar_para_sheets(partes)
+    listagem.marcar_processado(arquivo)
 
 def main():
-    arquivos_vistos = set()
+    listagem = ListagemIncremental(s3, BUCKET_NAME, PREFIX, ARQUIVO_ESTADO)
+    busca = BuscaConcorrente(s3, BUCKET_NAME, DOWNLOADS_SIMULTANEOS, LIMITE_BYTES_EM_MEMORIA)
+    ciclo = 0
     while True:
         try:
-            arquivos = listar_arquivos_s3()
-            novos = [a for a in arquivos if a not in arquivos_vistos]
+            # A cada VARREDURA_A_CADA ciclos, reconcilia listando o bucket inteiro
+            ciclo += 1
+            if ciclo % VARREDURA_A_CADA == 0:
+                novos = listagem.varredura_completa()
+            else:
+                novos = listagem.novos()
 
-            for arquivo in novos:
-                print(f'Novo arquivo detectado: {arquivo}')
-                conteudo = baixar_arquivo_s3(arquivo)
-                processar_json_e_enviar_para_sheets(conteudo)
-                arquivos_vistos.add(arquivo)
+            # Downloads em paralelo, processamento na ordem das chaves
+            for arquivo, partes in busca.buscar(novos):
+                processar_arquivo(listagem, arquivo, partes)
 
             time.sleep(POLL_INTERVAL)
         except Exception as e:
             print(f'Erro: {e}')
             time.sleep(POLL_INTERVAL)
 
+def main_eventos():
+    listagem = ListagemIncremental(s3, BUCKET_NAME, PREFIX, ARQUIVO_ESTADO)
+    sqs = criar_cliente_sqs(
+        FILA_EVENTOS_URL,
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        aws_session_token=AWS_SESSION_TOKEN
+    )
+
+    def tratar(bucket, chave):
+        # Notificações podem chegar repetidas (entrega at-least-once)
+        if bucket != BUCKET_NAME or not chave.startswith(PREFIX) or listagem.ja_processado(chave):
+            return
+        processar_arquivo(listagem, chave)
+
+    def reconciliar():
+        for arquivo in listagem.varredura_completa():
+            processar_arquivo(listagem, arquivo)
+
+    consumir_eventos(
+        sqs, FILA_EVENTOS_URL, tratar, reconciliar, INTERVALO_RECONCILIACAO,
+        max_recebimentos=MAX_RECEBIMENTOS, url_fila_falhas=FILA_FALHAS_URL
+    )
+
 if __name__ == "__main__":
-    main()
+    escritor_sheets.iniciar()
+    try:
+        if FILA_EVENTOS_URL:
+            main_eventos()
+        else:
+            main()
+    finally:
+        # Descarrega o que ficou na fila e libera o lock para outro poller escrever
+        escritor_sheets.parar()
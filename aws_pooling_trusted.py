@@ -1,9 +1,12 @@
+import os
 import time
 import boto3
 import gspread
 import csv
 import io
 from google.oauth2.service_account import Credentials
+from eventos_s3 import consumir_eventos, criar_cliente_sqs
+from escritor_sheets import EscritorSheets, FilaSheets, abrir_aba_gspread
 
 AWS_ACCESS_KEY_ID = ''
 AWS_SECRET_ACCESS_KEY = ''
@@ -12,15 +15,27 @@ AWS_SESSION_TOKEN = ''
 BUCKET_NAME = 'ecofirewatch-trusted'
 PREFIX = ''
 POLL_INTERVAL = 60
+# Com a URL de uma fila SQS que recebe os eventos ObjectCreated do bucket,
+# roda no modo por eventos; a listagem vira varredura de reconciliação
+FILA_EVENTOS_URL = os.environ.get('FILA_EVENTOS_URL', '')
+INTERVALO_RECONCILIACAO = 900
+# Mensagens que falham MAX_RECEBIMENTOS vezes vão para esta fila (ou são descartadas)
+FILA_FALHAS_URL = os.environ.get('FILA_FALHAS_URL')
+MAX_RECEBIMENTOS = 5
+# Escritas no Sheets passam por uma fila compartilhada entre os pollers
+ARQUIVO_FILA_SHEETS = os.environ.get('FILA_SHEETS', 'fila_sheets.sqlite3')
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 SERVICE_ACCOUNT_FILE = r'ecofirewatch-0089310b8142.json'
 SPREADSHEET_ID = '1TLGOryLr4zrdEzJy9QgioeYZePlxJr9xr8vQKJAHXdo'
-WORKSHEET_NAME = 'Sensor'
+# Aba própria: aws_pooling anexa na 'Sensor', e substituir aqui apagaria aquelas linhas.
+# Se ainda não existir na planilha, o escritor cria a aba na primeira escrita
+WORKSHEET_NAME = 'SensorTrusted'
 
 credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
 gc = gspread.authorize(credentials)
-sheet = gc.open_by_key(SPREADSHEET_ID).worksheet(WORKSHEET_NAME)
+fila_sheets = FilaSheets(ARQUIVO_FILA_SHEETS)
+escritor_sheets = EscritorSheets(fila_sheets, abrir_aba_gspread(gc))
 
 s3 = boto3.client(
     's3',
@@ -44,20 +59,18 @@ def baixar_arquivo_s3(key):
     return response['Body'].read().decode('utf-8')
 
 def processar_csv_e_enviar_para_sheets(conteudo_arquivo):
-    try:
-        reader = csv.reader(io.StringIO(conteudo_arquivo), delimiter=';')
-        linhas = list(reader)
-
-        if not linhas:
-            print("CSV vazio.")
-            return
+    # Erros sobem: o main não avança ultimo_arquivo_visto e a mensagem do
+    # SQS não é apagada, então o arquivo é tentado de novo
+    reader = csv.reader(io.StringIO(conteudo_arquivo), delimiter=';')
+    linhas = list(reader)
 
-        sheet.clear()
-        sheet.update('A1', linhas)
-        print("Dados CSV enviados com sucesso ao Google Sheets.")
+    if not linhas:
+        print("CSV vazio.")
+        return
 
-    except Exception as e:
-        print(f"Erro ao processar e enviar CSV para o Sheets: {e}")
+    # Reescreve só as linhas que mudaram em relação ao que está na aba
+    fila_sheets.substituir(SPREADSHEET_ID, WORKSHEET_NAME, linhas)
+    print("Dados CSV enfileirados para o Google Sheets.")
 
 def main():
     ultimo_arquivo_visto = None
@@ -78,5 +91,46 @@ def main():
             print(f'Erro: {e}')
             time.sleep(POLL_INTERVAL)
 
+def main_eventos():
+    sqs = criar_cliente_sqs(
+        FILA_EVENTOS_URL,
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        aws_session_token=AWS_SESSION_TOKEN
+    )
+    # Só o CSV mais recente vai para o Sheets; um evento atrasado de um
+    # arquivo mais antigo não pode sobrescrever o atual
+    ultimo = {"chave": None, "modificado": None}
+
+    def processar_se_mais_recente(chave, modificado):
+        if chave == ultimo["chave"] or (ultimo["modificado"] and modificado < ultimo["modificado"]):
+            return
+        print(f'Novo arquivo detectado: {chave}')
+        processar_csv_e_enviar_para_sheets(baixar_arquivo_s3(chave))
+        ultimo["chave"], ultimo["modificado"] = chave, modificado
+
+    def tratar(bucket, chave):
+        if bucket != BUCKET_NAME or not chave.startswith(PREFIX) or not chave.endswith('.csv'):
+            return
+        processar_se_mais_recente(chave, s3.head_object(Bucket=BUCKET_NAME, Key=chave)['LastModified'])
+
+    def reconciliar():
+        chave = listar_ultimo_csv_s3()
+        if chave:
+            processar_se_mais_recente(chave, s3.head_object(Bucket=BUCKET_NAME, Key=chave)['LastModified'])
+
+    consumir_eventos(
+        sqs, FILA_EVENTOS_URL, tratar, reconciliar, INTERVALO_RECONCILIACAO,
+        max_recebimentos=MAX_RECEBIMENTOS, url_fila_falhas=FILA_FALHAS_URL
+    )
+
 if __name__ == "__main__":
-    main()
+    escritor_sheets.iniciar()
+    try:
+        if FILA_EVENTOS_URL:
+            main_eventos()
+        else:
+            main()
+    finally:
+        # Descarrega o que ficou na fila e libera o lock para outro poller escrever
+        escritor_sheets.parar()
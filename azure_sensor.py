@@ -1,8 +1,14 @@
 import numpy as np
 from azure.iot.device import IoTHubDeviceClient, Message
+from azure.iot.device.aio import IoTHubDeviceClient as AsyncIoTHubDeviceClient
+import argparse
+import asyncio
+import random
+import struct
 import time
 import json
 from datetime import datetime
+from iot_sensor_simulation.edge_reduction import REDUCTION_MODES, build_reducer
 
 class TemperatureSensor:
     def __init__(self, initial_value, min_value, max_value):
@@ -81,15 +87,19 @@ class WindDirectionSensor:
         self.current_value = round_number(self.currente_value, self.min_value, self.max_value)
         return self.currente_value
 
-sensors = [
-    TemperatureSensor(25.0, -200, 600),
-    AirHumiditySensor(60.0, 0, 100),
-    SoilHumiditySensor(40.0, 0, 100),
-    Co2Sensor(4.0, 0, 100),
-    AirQualitySensor(8.0, 0, 100),
-    WindSpeedSensor(5.0, 0, 200),
-    WindDirectionSensor(0, 0, 360)
-]
+def build_sensors():
+    return [
+        TemperatureSensor(25.0, -200, 600),
+        AirHumiditySensor(60.0, 0, 100),
+        SoilHumiditySensor(40.0, 0, 100),
+        Co2Sensor(4.0, 0, 100),
+        AirQualitySensor(8.0, 0, 100),
+        WindSpeedSensor(5.0, 0, 200),
+        WindDirectionSensor(0, 0, 360)
+    ]
+
+sensors = build_sensors()
+keys = ["temperatura", "airHumidity", "airSoil", "co2", "airQuality", "windSpeed", "windDirection"]
 
 def open_iot_hub_connection():
     CONNECTION_STRING = "HostName=EcoFireWatch-IotHub.azure-devices.net;DeviceId=sensor_simulation;SharedAccessKey=RKL/20zuz4b+6/kiRWS8LDU9VNmFAbapYyBYltqtNTQ="
@@ -115,7 +125,6 @@ def begin_simulation():
 
         while (True):
             data_tuple = tuple(sensor.simulate(0.5) for sensor in sensors)
-            keys = ["temperatura", "airHumidity", "airSoil", "co2", "airQuality", "windSpeed", "windDirection"]
 
             dictionary = dict(zip(keys, data_tuple))
             dictionary["insertDate"] = datetime.now().isoformat()
@@ -133,6 +142,281 @@ def begin_simulation():
         if client:
             client.disconnect()
 
+# ---------------------- Frota de dispositivos (asyncio) ----------------------
+class FleetStats:
+    """Contadores da frota: mensagens, leituras, bytes e latência dos envios.
+
+    As latências ficam numa amostra de reservatório de `latency_sample_size`
+    envios (uniforme sobre todos os envios), então a memória não cresce com
+    a duração do teste.
+    """
+
+    def __init__(self, latency_sample_size=10000):
+        self.messages = 0
+        self.readings = 0
+        self.bytes = 0
+        self.errors = 0
+        self.latency_sample_size = latency_sample_size
+        self.latencies = []
+        self.reducers = []
+        self.started = time.perf_counter()
+
+    def record(self, readings, size, latency):
+        self.messages += 1
+        self.readings += readings
+        self.bytes += size
+        if len(self.latencies) < self.latency_sample_size:
+            self.latencies.append(latency)
+        else:
+            slot = random.randrange(self.messages)
+            if slot < self.latency_sample_size:
+                self.latencies[slot] = latency
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        p50, p95, p99 = (float(p) for p in np.percentile(latencies, [50, 95, 99]))
+        summary = {
+            "seconds": elapsed,
+            "messages": self.messages,
+            "readings": self.readings,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "messages_per_second": self.messages / elapsed,
+            "bytes_per_second": self.bytes / elapsed,
+            "latency_ms_p50": p50,
+            "latency_ms_p95": p95,
+            "latency_ms_p99": p99,
+        }
+        print(f"📊 {self.messages} mensagens ({self.readings} leituras) em {elapsed:.1f}s | "
+              f"{summary['messages_per_second']:.1f} msg/s | {summary['bytes_per_second'] / 1024:.1f} KB/s | "
+              f"latência p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms | erros: {self.errors}")
+
+        if self.reducers:
+            # Soma a redução de todos os dispositivos
+            raw = sum(reducer.raw_values for reducer in self.reducers)
+            emitted = sum(reducer.emitted_values for reducer in self.reducers)
+            summary["reduction_mode"] = self.reducers[0].mode
+            summary["reduction_ratio"] = raw / emitted if emitted else float("inf")
+            summary["reduction_max_abs_error"] = max(reducer.max_abs_error for reducer in self.reducers)
+            summary["reduction_rmse"] = float(np.sqrt(sum(reducer.squared_error for reducer in self.reducers) / raw)) if raw else 0.0
+            print(f"✂️  Redução ({summary['reduction_mode']}): {raw} valores -> {emitted} ({summary['reduction_ratio']:.1f}x) | "
+                  f"erro máx {summary['reduction_max_abs_error']:.4f} | RMSE {summary['reduction_rmse']:.4f}")
+        return summary
+
+def azure_client_factory(connection_strings):
+    """Um IoTHubDeviceClient assíncrono por dispositivo, cada um com sua connection string."""
+    def factory(index):
+        return AsyncIoTHubDeviceClient.create_from_connection_string(connection_strings[index])
+    return factory
+
+class LocalBrokerClient:
+    """Cliente do `LocalBroker`: mesma interface do cliente assíncrono do IoT Hub.
+
+    Cada mensagem vai com 4 bytes de tamanho na frente e espera 1 byte de
+    confirmação, então a latência medida inclui a ida e volta.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def send_message(self, message):
+        body = message.data if isinstance(message, Message) else message
+        if isinstance(body, str):
+            body = body.encode()
+        async with self.lock:
+            self.writer.write(struct.pack(">I", len(body)) + body)
+            await self.writer.drain()
+            await self.reader.readexactly(1)
+
+    async def shutdown(self):
+        if self.writer:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+class LocalBroker:
+    """Broker TCP local que só confirma e conta mensagens, para testar a frota sem o Azure."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.messages = 0
+        self.bytes = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                size, = struct.unpack(">I", await reader.readexactly(4))
+                await reader.readexactly(size)
+                self.messages += 1
+                self.bytes += size
+                writer.write(b"\x01")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def client_factory(self):
+        return lambda index: LocalBrokerClient(self.host, self.port)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+def build_message(device_id, readings, mode="raw"):
+    """Corpo compacto (sem indentação) com várias leituras de um dispositivo.
+
+    raw: [insertDate, valor por chave]; deadband: igual, com null no que não
+    mudou; window: [início da janela, contagem, [min, max, média] por chave].
+    """
+    body = json.dumps({"deviceId": device_id, "mode": mode, "keys": keys, "readings": readings}, separators=(",", ":"))
+    return Message(body, content_encoding="utf-8", content_type="application/json")
+
+def reduce_reading(reducer, now, values):
+    """Aplica a redução na borda a uma leitura; devolve as linhas a enviar (talvez nenhuma)."""
+    if reducer is None:
+        return [[now.isoformat()] + values]
+    if reducer.mode == "deadband":
+        mask = reducer.reduce(np.array(values))[0].tolist()
+        if not any(mask):
+            return []
+        return [[now.isoformat()] + [value if emit else None for value, emit in zip(values, mask)]]
+    return window_rows(reducer.reduce(np.array([now], dtype="datetime64[us]"), np.array(values)))
+
+def window_rows(summaries):
+    return [
+        [str(summary["window_start"]), summary["count"]]
+        + [list(bounds) for bounds in zip(summary["min"].tolist(), summary["max"].tolist(), summary["mean"].tolist())]
+        for summary in summaries
+    ]
+
+async def send_readings(client, stats, device_id, readings, mode):
+    message = build_message(device_id, readings, mode)
+    start = time.perf_counter()
+    try:
+        await client.send_message(message)
+        stats.record(len(readings), len(message.data), time.perf_counter() - start)
+    except Exception as e:
+        stats.errors += 1
+        print(f"Falha ao enviar do dispositivo {device_id}: {e}")
+
+async def simulate_device(index, client, stats, readings_per_message, reading_interval, deadline, reduction=None):
+    """Um dispositivo: sensores próprios, uma leitura a cada `reading_interval` segundos.
+
+    `reduction` são os argumentos de `build_reducer` (modo deadband ou window).
+    """
+    device_sensors = build_sensors()
+    device_id = f"sensor_simulation_{index}"
+    reducer = build_reducer(**reduction) if reduction else None
+    mode = reducer.mode if reducer else "raw"
+    if reducer:
+        stats.reducers.append(reducer)
+    readings = []
+    # Espalha os dispositivos dentro do primeiro intervalo para não enviarem juntos
+    next_reading = time.perf_counter() + random.uniform(0, reading_interval)
+
+    while next_reading < deadline:
+        await asyncio.sleep(max(0.0, next_reading - time.perf_counter()))
+        next_reading += reading_interval
+        readings += reduce_reading(reducer, datetime.now(), [sensor.simulate(0.5) for sensor in device_sensors])
+        if len(readings) < readings_per_message:
+            continue
+
+        await send_readings(client, stats, device_id, readings, mode)
+        readings = []
+
+    # No fim do teste: fecha a janela aberta e envia o que ficou no buffer
+    if reducer is not None and reducer.mode == "window":
+        readings += window_rows(reducer.flush())
+    if readings:
+        await send_readings(client, stats, device_id, readings, mode)
+
+async def run_fleet(n_devices, client_factory, readings_per_message=10, reading_interval=1.0,
+                    duration=60, connect_concurrency=50, reduction=None):
+    """Simula `n_devices` dispositivos, cada um com sua conexão, por `duration` segundos."""
+    stats = FleetStats()
+    clients = [client_factory(index) for index in range(n_devices)]
+    limit = asyncio.Semaphore(connect_concurrency)
+
+    async def connect(client):
+        async with limit:
+            await client.connect()
+
+    await asyncio.gather(*(connect(client) for client in clients))
+    print(f"🔌 {n_devices} dispositivos conectados")
+
+    stats.started = time.perf_counter()
+    deadline = stats.started + duration
+    try:
+        await asyncio.gather(*(
+            simulate_device(index, client, stats, readings_per_message, reading_interval, deadline, reduction)
+            for index, client in enumerate(clients)
+        ))
+    finally:
+        await asyncio.gather(*(client.shutdown() for client in clients), return_exceptions=True)
+    return stats.report()
+
+def begin_fleet_simulation(n_devices=100, readings_per_message=10, reading_interval=1.0, duration=60,
+                           connection_strings=None, local_broker=False, edge_reduction=None,
+                           deadband=0.5, window_seconds=60):
+    """Frota simulada contra o IoT Hub (`connection_strings`, uma por dispositivo) ou contra o broker local."""
+    reduction = None
+    if edge_reduction not in (None, "raw"):
+        reduction = {
+            "mode": edge_reduction, "deadband": deadband, "window_seconds": window_seconds,
+            "wrap": [keys.index("windDirection")],
+        }
+
+    async def main():
+        if not local_broker:
+            if len(connection_strings or []) < n_devices:
+                raise ValueError("É preciso uma connection string por dispositivo")
+            return await run_fleet(n_devices, azure_client_factory(connection_strings),
+                                   readings_per_message, reading_interval, duration, reduction=reduction)
+        broker = await LocalBroker().start()
+        try:
+            return await run_fleet(n_devices, broker.client_factory(),
+                                   readings_per_message, reading_interval, duration, reduction=reduction)
+        finally:
+            print(f"📥 Broker local recebeu {broker.messages} mensagens ({broker.bytes / 1024:.1f} KB)")
+            await broker.stop()
+
+    return asyncio.run(main())
 
 if __name__ == "__main__":
-    begin_simulation()
+    parser = argparse.ArgumentParser(description="Simulador de sensores para o Azure IoT Hub")
+    parser.add_argument("--devices", type=int, help="Simula uma frota com esse número de dispositivos")
+    parser.add_argument("--readings-per-message", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=1.0, help="Segundos entre leituras de cada dispositivo")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--connection-strings", help="Arquivo com uma connection string por linha")
+    parser.add_argument("--local-broker", action="store_true", help="Envia para um broker TCP local em vez do IoT Hub")
+    parser.add_argument("--edge-reduction", choices=REDUCTION_MODES, default="raw")
+    parser.add_argument("--deadband", type=float, default=0.5, help="Variação mínima para emitir no modo deadband")
+    parser.add_argument("--window-seconds", type=float, default=60, help="Tamanho da janela no modo window")
+    args = parser.parse_args()
+
+    if args.devices is None:
+        begin_simulation()
+    else:
+        connection_strings = None
+        if args.connection_strings:
+            with open(args.connection_strings) as f:
+                connection_strings = [line.strip() for line in f if line.strip()]
+        begin_fleet_simulation(args.devices, args.readings_per_message, args.interval, args.duration,
+                               connection_strings, args.local_broker, args.edge_reduction,
+                               args.deadband, args.window_seconds)
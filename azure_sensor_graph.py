@@ -4,7 +4,7 @@ import time
 import json
 from datetime import datetime
 import matplotlib.pyplot as plt
-import pandas as pd
+import matplotlib.dates as mdates
 
 class TemperatureSensor:
     def __init__(self, initial_value, min_value, max_value):
@@ -123,60 +123,156 @@ def send_iot_hub_message(client, message):
 
 import threading
 
-def generate_graphs(data, interval, stop_event):
+units = {
+    "temperatura": " (°C)",
+    "airHumidity": " (%)",
+    "airSoil": " (%)",
+    "co2": " (ppm)",
+    "airQuality": " (ppm)",
+    "windSpeed": " (m/s)",
+    "windDirection": " (°)"
+}
+
+class SeriesBuffer:
+    """Janela fixa das últimas `capacity` leituras, em arrays pré-alocados.
+
+    Quem escreve chama `append`; o gráfico espera em `updated` e lê com
+    `view`. A memória não cresce com o tempo de execução.
+    """
+
+    def __init__(self, keys, capacity=8640):
+        self.keys = list(keys)
+        self.capacity = capacity
+        self.times = np.empty(capacity)
+        self.values = np.empty((capacity, len(self.keys)))
+        self.start = 0
+        self.size = 0
+        self.lock = threading.Lock()
+        self.updated = threading.Event()
+
+    def append(self, timestamp, values):
+        with self.lock:
+            position = (self.start + self.size) % self.capacity
+            self.times[position] = mdates.date2num(timestamp)
+            self.values[position] = values
+            if self.size < self.capacity:
+                self.size += 1
+            else:
+                self.start = (self.start + 1) % self.capacity
+        self.updated.set()
+
+    def view(self):
+        """Cópia ordenada (mais antiga primeiro) de tempos e valores."""
+        with self.lock:
+            order = (self.start + np.arange(self.size)) % self.capacity
+            return self.times[order], self.values[order]
+
+    def __len__(self):
+        return self.size
+
+def downsample(times, values, max_points):
+    """Reduz a série a ~`max_points` pontos mantendo o mínimo e o máximo de cada faixa.
+
+    Picos continuam visíveis, ao contrário de pegar um ponto a cada N.
+    """
+    if max_points < 2:
+        raise ValueError(f"max_points precisa ser >= 2 (mínimo e máximo de cada faixa), recebido {max_points}")
+    if len(times) <= max_points:
+        return times, values
+    bucket = int(np.ceil(len(times) / (max_points // 2)))
+    usable = len(times) // bucket * bucket
+    grouped = values[:usable].reshape(-1, bucket)
+    rows = np.arange(len(grouped))
+    low = grouped.argmin(axis=1)
+    high = grouped.argmax(axis=1)
+    # Cada faixa vira dois pontos, em ordem de tempo
+    first = np.minimum(low, high)
+    second = np.maximum(low, high)
+    index = (np.column_stack([first, second]) + (rows * bucket)[:, None]).ravel()
+    index = np.concatenate([index, np.arange(usable, len(times))])
+    return times[index], values[index]
+
+def expanded_limits(low, high, headroom):
+    span = high - low
+    if span <= 0:
+        span = abs(high) or 1.0
+    return low - span * headroom, high + span * headroom
+
+def capture_background(chart):
+    """Guarda o fundo sem a linha animada e redesenha a linha por cima.
+
+    Ligado ao draw_event: qualquer redesenho completo (o nosso, um resize da
+    janela, zoom pela toolbar) atualiza o fundo usado no blit, sem deixar
+    restos da imagem antiga.
+    """
+    fig, ax = chart["figure"], chart["axis"]
+    chart["background"] = fig.canvas.copy_from_bbox(ax.bbox)
+    ax.draw_artist(chart["line"])
+
+def generate_graphs(history, interval, stop_event, max_points=1000):
     plt.ion()
-    figures = {}
-    axis = {}
+    charts = {}
 
-    for key in keys:
+    for column, key in enumerate(keys):
         fig = plt.figure(figsize=(8, 4))
         fig.canvas.manager.set_window_title(keys[key])
         ax = fig.add_subplot(1, 1, 1)
-        figures[key] = fig
-        axis[key] = ax
+        line, = ax.plot([], [], marker='o', markersize=3, animated=True)
+        ax.set_title(keys[key])
+        ax.set_xlabel("Data e Hora")
+        ax.set_ylabel(keys[key] + units.get(key, ""))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M:%S"))
+        ax.tick_params(axis='x', rotation=45)
+        ax.grid(True)
+        fig.tight_layout()
+        charts[key] = {"figure": fig, "axis": ax, "line": line, "column": column, "background": None}
+        fig.canvas.mpl_connect("draw_event", lambda event, chart=charts[key]: capture_background(chart))
+
+    plt.show(block=False)
 
     while not stop_event.is_set():
-        if not data:
+        # Espera leitura nova em vez de girar; o timeout mantém a janela responsiva
+        if not history.updated.wait(interval):
+            for chart in charts.values():
+                chart["figure"].canvas.flush_events()
             continue
+        history.updated.clear()
 
-        df = pd.DataFrame(data)
-
-        for key in keys:
-            if len(df) > 1:
-                ax = axis[key]
-                ax.cla()
-                ax.plot(df['insertDate'], df[key], marker='o')
-                ax.set_title(keys[key])
-                ax.set_xlabel("Data e Hora")
-
-                unidade = {
-                    "temperatura": " (°C)",
-                    "airHumidity": " (%)",
-                    "airSoil": " (%)",
-                    "co2": " (ppm)",
-                    "airQuality": " (ppm)",
-                    "windSpeed": " (m/s)",
-                    "windDirection": " (°)"
-                }.get(key, "")
-
-                ax.set_ylabel(keys[key] + unidade)
-                ax.tick_params(axis='x', rotation=45)
-                ax.grid(True)
-                figures[key].tight_layout()
-
-        plt.pause(interval)
+        if len(history) < 2:
+            continue
 
+        times, values = history.view()
+        for key, chart in charts.items():
+            x, y = downsample(times, values[:, chart["column"]], max_points)
+            fig, ax, line = chart["figure"], chart["axis"], chart["line"]
+            line.set_data(x, y)
 
+            x_low, x_high = ax.get_xlim()
+            y_low, y_high = ax.get_ylim()
+            if chart["background"] is None or x[0] < x_low or x[-1] > x_high or y.min() < y_low or y.max() > y_high:
+                # Os limites mudam só de vez em quando (com folga), e só aí redesenha tudo
+                ax.set_xlim(x[0], expanded_limits(x[0], x[-1], 0.25)[1])
+                ax.set_ylim(*expanded_limits(y.min(), y.max(), 0.1))
+                # O draw_event recaptura o fundo e desenha a linha
+                fig.canvas.draw()
+            else:
+                fig.canvas.restore_region(chart["background"])
+                ax.draw_artist(line)
+            fig.canvas.blit(ax.bbox)
+            fig.canvas.flush_events()
 
-def begin_simulation(interval=10):
+def begin_simulation(interval=10, window=8640, max_points=1000):
+    if max_points < 2:
+        raise ValueError(f"max_points precisa ser >= 2, recebido {max_points}")
     try:
         client = open_iot_hub_connection()
-        data = []
+        # `window` leituras ficam no gráfico (8640 = 1 dia a cada 10 s)
+        history = SeriesBuffer(keys, window)
 
         stop_event = threading.Event()
         graphs_thread = threading.Thread(
             target=generate_graphs,
-            args=(data, interval, stop_event),
+            args=(history, interval, stop_event, max_points),
             daemon=True
         )
         graphs_thread.start()
@@ -184,15 +280,14 @@ def begin_simulation(interval=10):
         while True:
             data_tuple = tuple(sensor.simulate(0.5) for sensor in sensors)
 
+            now = datetime.now()
             dictionary = dict(zip(keys, data_tuple))
-            dictionary["insertDate"] = datetime.now().isoformat()
-            dictionaryGraph = dict(zip(keys, data_tuple))
-            dictionaryGraph["insertDate"] = datetime.now().strftime("%H:%M:%S")
+            dictionary["insertDate"] = now.isoformat()
             json_str = json.dumps(dictionary, indent=2)
 
             # send_iot_hub_message(client, json_str)
             print("Enviando JSON ao Azure\n" + json_str)
-            data.append(dictionary)
+            history.append(now, data_tuple)
 
             time.sleep(interval)
 
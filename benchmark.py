@@ -0,0 +1,317 @@
+import argparse
+import copy
+import datetime
+import importlib
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import psutil
+
+PASTA_REPOSITORIO = os.path.dirname(os.path.abspath(__file__))
+PASTA_RESULTADOS = "benchmarks"
+BASELINE_PADRAO = os.path.join(PASTA_RESULTADOS, "baseline.json")
+
+# ---------------------- Etapas ----------------------
+# Cada etapa é um par (preparar, executar): `preparar(qtd_dados)` monta a
+# entrada fora da medição e `executar(entrada)` é o trecho cronometrado.
+# Os módulos são importados só quando a etapa roda, porque alguns abrem
+# conexões (MySQL, S3) já no import.
+
+def _gerar_sem_banco(qtd_dados):
+    import sensor_simulation_algas_no_db
+    return sensor_simulation_algas_no_db.gerar_dados_paralelo(qtd_dados)
+
+def _gerar_multiprocesso(qtd_dados, num_processos=None):
+    import sensor_simulation_algas_no_db
+    return sensor_simulation_algas_no_db.gerar_dados_multiprocesso(qtd_dados, num_processos)
+
+def _colunas_para_bucket(qtd_dados):
+    import sensor_simulation_algas_to_bucket
+    return sensor_simulation_algas_to_bucket.gerar_colunas(qtd_dados)
+
+def _serializar(colunas):
+    import sensor_simulation_algas_to_bucket
+    return sensor_simulation_algas_to_bucket.data_to_json(colunas)
+
+def _gerar_com_banco(qtd_dados):
+    # Gerador preguiçoso: os blocos são produzidos enquanto o banco consome
+    import sensor_simulation_algas
+    return sensor_simulation_algas.gerar_dados_em_blocos(qtd_dados)
+
+def _salvar_no_banco(dados):
+    import sensor_simulation_algas
+    sensor_simulation_algas.salvar_no_banco(dados)
+
+def _salvar_em_pipeline(qtd_dados):
+    import sensor_simulation_algas
+    sensor_simulation_algas.salvar_em_pipeline(qtd_dados)
+
+def _json_para_bucket(qtd_dados):
+    return _serializar(_colunas_para_bucket(qtd_dados))
+
+def _enviar_para_bucket(conteudo):
+    import sensor_simulation_algas_to_bucket
+    sensor_simulation_algas_to_bucket.enviar_para_s3(conteudo)
+
+def _enviar_stream_para_bucket(qtd_dados):
+    import sensor_simulation_algas_to_bucket
+    sensor_simulation_algas_to_bucket.enviar_stream_para_s3(qtd_dados)
+
+ETAPAS = {
+    "geracao": (lambda qtd_dados: qtd_dados, _gerar_sem_banco),
+    # Base de 1 processo e todos os núcleos; `escalabilidade` varre as quantidades no meio
+    "geracao_1_processo": (lambda qtd_dados: qtd_dados, lambda qtd_dados: _gerar_multiprocesso(qtd_dados, 1)),
+    "geracao_multiprocesso": (lambda qtd_dados: qtd_dados, _gerar_multiprocesso),
+    "serializacao": (_colunas_para_bucket, _serializar),
+    "salvamento_mysql": (_gerar_com_banco, _salvar_no_banco),
+    "pipeline_mysql": (lambda qtd_dados: qtd_dados, _salvar_em_pipeline),
+    "upload_s3": (_json_para_bucket, _enviar_para_bucket),
+    "upload_s3_stream": (lambda qtd_dados: qtd_dados, _enviar_stream_para_bucket),
+}
+
+# ---------------------- Execução ----------------------
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if len(ordenados) == 1:
+        return ordenados[0]
+    posicao = (len(ordenados) - 1) * p / 100
+    abaixo = int(posicao)
+    acima = min(abaixo + 1, len(ordenados) - 1)
+    return ordenados[abaixo] + (ordenados[acima] - ordenados[abaixo]) * (posicao - abaixo)
+
+def medir_etapa(nome, preparar, executar, qtd_dados, aquecimento=1, repeticoes=5):
+    """Roda `aquecimento` execuções descartadas e `repeticoes` medidas de uma etapa.
+
+    O pico de memória vem de uma execução extra com tracemalloc, fora das
+    medições de tempo, para o rastreamento não distorcer os tempos.
+    """
+    tempos = []
+    for i in range(aquecimento + repeticoes):
+        entrada = preparar(qtd_dados)
+        inicio = time.perf_counter()
+        executar(entrada)
+        duracao = time.perf_counter() - inicio
+        del entrada
+        if i >= aquecimento:
+            tempos.append(duracao)
+
+    ja_rastreando = tracemalloc.is_tracing()
+    entrada = preparar(qtd_dados)
+    if ja_rastreando:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    executar(entrada)
+    pico_memoria = tracemalloc.get_traced_memory()[1]
+    if not ja_rastreando:
+        tracemalloc.stop()
+    del entrada
+
+    return {
+        "etapa": nome,
+        "qtd_dados": qtd_dados,
+        "repeticoes": repeticoes,
+        "aquecimento": aquecimento,
+        "mediana": statistics.median(tempos),
+        "p95": percentil(tempos, 95),
+        "min": min(tempos),
+        "max": max(tempos),
+        "tempos": tempos,
+        "memoria_mb": psutil.Process().memory_info().rss / (1024 * 1024),
+        "memoria_max_mb": pico_memoria / (1024 * 1024),
+    }
+
+def executar_benchmark(etapas, ranges, aquecimento=1, repeticoes=5, salvar=True):
+    """Mede cada etapa para cada quantidade de `ranges`.
+
+    `etapas` é um dict nome -> (preparar, executar), como `ETAPAS`. Os
+    resultados são salvos em `benchmarks/<revisao>_<maquina>.json`.
+    """
+    resultados = []
+    for nome, (preparar, executar) in etapas.items():
+        for qtd_dados in ranges:
+            print(f"\n⏱️  {nome}: {qtd_dados} dados ({aquecimento} aquecimento, {repeticoes} repetições)...")
+            try:
+                resultado = medir_etapa(nome, preparar, executar, qtd_dados, aquecimento, repeticoes)
+            except Exception as e:
+                print(f"❌ Etapa {nome} falhou: {e}")
+                break
+            resultados.append(resultado)
+            print(f"✅ {nome} | {qtd_dados} dados | Mediana: {resultado['mediana']:.4f}s | p95: {resultado['p95']:.4f}s")
+
+    relatorio = {
+        "revisao": revisao_git(),
+        "maquina": descricao_maquina(),
+        "data": datetime.datetime.now().isoformat(),
+        "resultados": resultados,
+    }
+    if salvar:
+        caminho = salvar_relatorio(relatorio)
+        print(f"\n💾 Resultados salvos em {caminho}")
+    return relatorio
+
+# ---------------------- Resultados ----------------------
+def por_etapa(relatorio, etapa):
+    return {r["qtd_dados"]: r for r in relatorio["resultados"] if r["etapa"] == etapa}
+
+def revisao_git():
+    try:
+        revisao = subprocess.run(
+            ["git", "rev-parse", "--short=12", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=PASTA_REPOSITORIO
+        ).stdout.strip()
+        alterado = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True, cwd=PASTA_REPOSITORIO
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecida"
+    return revisao + ("-dirty" if alterado else "")
+
+def descricao_maquina():
+    return {
+        "hostname": socket.gethostname(),
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+def salvar_relatorio(relatorio, pasta=PASTA_RESULTADOS):
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{relatorio['revisao']}_{relatorio['maquina']['hostname']}.json"
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    return caminho
+
+def comparar(caminho_atual, caminho_baseline=BASELINE_PADRAO, tolerancia=0.10):
+    """Compara as medianas com a baseline; devolve a lista de regressões."""
+    with open(caminho_baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(caminho_atual, encoding="utf-8") as f:
+        atual = json.load(f)
+
+    if baseline["maquina"]["hostname"] != atual["maquina"]["hostname"]:
+        print("⚠️  Baseline e resultado atual vêm de máquinas diferentes; a comparação é só indicativa.")
+
+    referencia = {(r["etapa"], r["qtd_dados"]): r for r in baseline["resultados"]}
+    regressoes = []
+    print(f"\nBaseline {baseline['revisao']} x atual {atual['revisao']} (tolerância {tolerancia:.0%})")
+    for resultado in atual["resultados"]:
+        chave = (resultado["etapa"], resultado["qtd_dados"])
+        if chave not in referencia:
+            continue
+        antes = referencia[chave]["mediana"]
+        depois = resultado["mediana"]
+        variacao = (depois - antes) / antes if antes > 0 else 0.0
+        marcador = "🔴 REGRESSÃO" if variacao > tolerancia else ("🟢" if variacao < -tolerancia else "  ")
+        print(f"{marcador} {chave[0]:<18} {chave[1]:>9} dados | {antes:.4f}s -> {depois:.4f}s ({variacao:+.1%})")
+        if variacao > tolerancia:
+            regressoes.append({"etapa": chave[0], "qtd_dados": chave[1], "antes": antes, "depois": depois, "variacao": variacao})
+    return regressoes
+
+# ---------------------- Verificação ----------------------
+# Módulos cujos sensores têm `medir_lote`; sensor_simulation_algas fica
+# fora do padrão porque conecta no MySQL já no import
+MODULOS_SENSORES = ("sensor_simulation_algas_no_db", "sensor_simulation_algas_to_bucket", "sensor_simulation_algas")
+
+def verificar_lote(sensores, n=10000, semente=0):
+    """Confere que `medir_lote(n)` gera a mesma série que n chamadas a `medir`.
+
+    Os dois caminhos usam geradores com a mesma semente sobre cópias do
+    sensor; devolve os nomes dos sensores em que as séries divergem.
+    """
+    divergentes = []
+    for sensor in sensores:
+        escalar, lote = copy.deepcopy(sensor), copy.deepcopy(sensor)
+        rng = np.random.RandomState(semente)
+        esperado = np.array([escalar.medir(rng) for _ in range(n)], dtype=np.float64)
+        obtido = lote.medir_lote(n, np.random.RandomState(semente))
+        diferenca = float(np.max(np.abs(esperado - obtido))) if n else 0.0
+        ok = diferenca < 1e-6 and abs(escalar.valor - lote.valor) < 1e-6
+        print(f"{'✅' if ok else '❌'} {sensor.nome}: {n} medições, maior diferença {diferenca:.2e}")
+        if not ok:
+            divergentes.append(sensor.nome)
+    return divergentes
+
+def verificar_modulos(modulos, n=10000, semente=0):
+    divergentes = []
+    for nome in modulos:
+        print(f"\n🔎 {nome}")
+        modulo = importlib.import_module(nome)
+        divergentes += [f"{nome}.{sensor}" for sensor in verificar_lote(modulo.sensors, n, semente)]
+    return divergentes
+
+# ---------------------- CLI ----------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das etapas de geração, serialização e envio.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    executar = subparsers.add_parser("executar", help="Roda o benchmark e salva o resultado em JSON")
+    executar.add_argument("--etapas", nargs="+", choices=list(ETAPAS), default=["geracao", "serializacao"])
+    executar.add_argument("--ranges", nargs="+", type=int, default=[1000, 10000, 100000])
+    executar.add_argument("--aquecimento", type=int, default=1)
+    executar.add_argument("--repeticoes", type=int, default=5)
+    executar.add_argument("--baseline", action="store_true", help="Salva também como baseline")
+
+    comparar_parser = subparsers.add_parser("comparar", help="Compara um resultado com a baseline")
+    comparar_parser.add_argument("atual")
+    comparar_parser.add_argument("--baseline", default=BASELINE_PADRAO)
+    comparar_parser.add_argument("--tolerancia", type=float, default=0.10)
+
+    escalabilidade = subparsers.add_parser("escalabilidade", help="Speedup da geração multiprocesso por número de processos")
+    escalabilidade.add_argument("--qtd-dados", type=int, default=1000000)
+    escalabilidade.add_argument("--processos", nargs="+", type=int)
+    escalabilidade.add_argument("--aquecimento", type=int, default=1)
+    escalabilidade.add_argument("--repeticoes", type=int, default=3)
+
+    verificar = subparsers.add_parser("verificar", help="Confere que medir_lote reproduz as chamadas a medir")
+    verificar.add_argument("--modulos", nargs="+", choices=MODULOS_SENSORES, default=list(MODULOS_SENSORES[:2]))
+    verificar.add_argument("-n", type=int, default=10000)
+    verificar.add_argument("--semente", type=int, default=0)
+
+    args = parser.parse_args(argv)
+
+    if args.comando == "executar":
+        etapas = {nome: ETAPAS[nome] for nome in args.etapas}
+        relatorio = executar_benchmark(etapas, args.ranges, args.aquecimento, args.repeticoes)
+        if args.baseline:
+            os.makedirs(os.path.dirname(BASELINE_PADRAO), exist_ok=True)
+            with open(BASELINE_PADRAO, "w", encoding="utf-8") as f:
+                json.dump(relatorio, f, indent=2, ensure_ascii=False)
+            print(f"📌 Baseline atualizada em {BASELINE_PADRAO}")
+        return 0
+
+    if args.comando == "escalabilidade":
+        import sensor_simulation_algas_no_db
+        sensor_simulation_algas_no_db.medir_escalabilidade(
+            args.qtd_dados, args.processos, args.aquecimento, args.repeticoes
+        )
+        return 0
+
+    if args.comando == "verificar":
+        divergentes = verificar_modulos(args.modulos, args.n, args.semente)
+        if divergentes:
+            print(f"\n{len(divergentes)} sensor(es) com medir_lote divergente: {', '.join(divergentes)}")
+            return 1
+        print("\nmedir_lote confere com medir em todos os sensores.")
+        return 0
+
+    regressoes = comparar(args.atual, args.baseline, args.tolerancia)
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima da tolerância.")
+        return 1
+    print("\nNenhuma regressão acima da tolerância.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
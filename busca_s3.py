@@ -0,0 +1,155 @@
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+class BuscaConcorrente:
+    """Baixa vários objetos do S3 em paralelo e os entrega na ordem das chaves.
+
+    Até `downloads_simultaneos` objetos são baixados ao mesmo tempo pelo
+    mesmo cliente (o pool de conexões do cliente deve ter pelo menos esse
+    tamanho). Cada objeto é lido em faixas (`Range`) de até `tamanho_faixa`
+    bytes, e o total de bytes baixados e ainda não consumidos nunca passa de
+    `limite_bytes`; objetos grandes chegam ao consumidor aos pedaços, sem
+    precisar caber inteiros na memória.
+
+    O objeto que o consumidor está lendo sempre pode reservar memória,
+    mesmo com o limite cheio, para os downloads adiantados não travarem o
+    da vez.
+    """
+
+    def __init__(self, s3, bucket, downloads_simultaneos=8, limite_bytes=64 * 1024 * 1024,
+                 tamanho_faixa=8 * 1024 * 1024, relatar_a_cada=5.0):
+        self.s3 = s3
+        self.bucket = bucket
+        self.downloads_simultaneos = downloads_simultaneos
+        self.limite_bytes = limite_bytes
+        self.tamanho_faixa = tamanho_faixa
+        self.relatar_a_cada = relatar_a_cada
+
+        self._condicao = threading.Condition()
+        self._em_uso = 0
+        self._da_vez = None
+        self._cancelado = False
+
+    # ---------------------- Orçamento de memória ----------------------
+    def _reservar(self, chave, n):
+        with self._condicao:
+            while not self._cancelado and chave != self._da_vez and self._em_uso and self._em_uso + n > self.limite_bytes:
+                self._condicao.wait()
+            self._em_uso += n
+            return not self._cancelado
+
+    def _liberar(self, n):
+        with self._condicao:
+            self._em_uso -= n
+            self._condicao.notify_all()
+
+    def _definir_da_vez(self, chave):
+        with self._condicao:
+            self._da_vez = chave
+            self._condicao.notify_all()
+
+    # ---------------------- Download ----------------------
+    def _baixar_faixa(self, chave, inicio):
+        try:
+            resposta = self.s3.get_object(
+                Bucket=self.bucket, Key=chave, Range=f"bytes={inicio}-{inicio + self.tamanho_faixa - 1}"
+            )
+        except ClientError as e:
+            # Objeto vazio: qualquer Range é inválido
+            if e.response.get("Error", {}).get("Code") == "InvalidRange" and inicio == 0:
+                return b"", 0
+            raise
+        total = re.search(r"/(\d+)$", resposta.get("ContentRange", ""))
+        total = int(total.group(1)) if total else resposta["ContentLength"]
+
+        tamanho = resposta["ContentLength"]
+        if not self._reservar(chave, tamanho):
+            resposta["Body"].close()
+            return None, total
+        return resposta["Body"].read(), total
+
+    def _baixar(self, chave, partes):
+        # Coloca na fila de `partes` cada faixa do objeto e depois None; ou a exceção
+        try:
+            inicio = 0
+            while True:
+                dados, total = self._baixar_faixa(chave, inicio)
+                if dados is None:
+                    return
+                partes.put(dados)
+                inicio += len(dados)
+                if inicio >= total or not dados:
+                    break
+            partes.put(None)
+        except Exception as e:
+            partes.put(e)
+
+    def _consumir(self, chave, partes, estatisticas):
+        while True:
+            parte = partes.get()
+            if parte is None:
+                estatisticas["objetos"] += 1
+                return
+            if isinstance(parte, Exception):
+                raise parte
+            estatisticas["bytes"] += len(parte)
+            try:
+                yield parte
+            finally:
+                self._liberar(len(parte))
+
+    def buscar(self, chaves):
+        """Gera (chave, partes) na ordem de `chaves`; `partes` itera os bytes do objeto.
+
+        As partes de um objeto devem ser consumidas antes de pedir o próximo.
+        """
+        chaves = list(chaves)
+        self._cancelado = False
+        estatisticas = {"objetos": 0, "bytes": 0}
+        inicio = ultimo_relato = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.downloads_simultaneos)
+        filas = {}
+
+        def enviar(indice):
+            if indice < len(chaves):
+                filas[indice] = queue.Queue()
+                executor.submit(self._baixar, chaves[indice], filas[indice])
+
+        try:
+            # Janela deslizante: no máximo `downloads_simultaneos` objetos à frente
+            # do consumidor, então o da vez nunca espera por uma thread livre
+            for indice in range(self.downloads_simultaneos):
+                enviar(indice)
+
+            for indice, chave in enumerate(chaves):
+                self._definir_da_vez(chave)
+                partes = self._consumir(chave, filas.pop(indice), estatisticas)
+                yield chave, partes
+                # Se o consumidor não leu tudo, termina de ler para liberar a memória e a thread
+                for _ in partes:
+                    pass
+                enviar(indice + self.downloads_simultaneos)
+
+                agora = time.perf_counter()
+                if agora - ultimo_relato >= self.relatar_a_cada:
+                    self._relatar(estatisticas, agora - inicio, len(chaves))
+                    ultimo_relato = agora
+        finally:
+            with self._condicao:
+                self._cancelado = True
+                self._condicao.notify_all()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._em_uso = 0
+            if chaves:
+                self._relatar(estatisticas, time.perf_counter() - inicio, len(chaves))
+
+    def _relatar(self, estatisticas, decorrido, total):
+        decorrido = max(decorrido, 1e-9)
+        print(f"📦 {estatisticas['objetos']}/{total} objetos | "
+              f"{estatisticas['objetos'] / decorrido:.1f} objetos/s | "
+              f"{estatisticas['bytes'] / decorrido / (1024 * 1024):.2f} MB/s")
@@ -0,0 +1,578 @@
+import contextlib
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# Cotas da API do Sheets: ~60 escritas por minuto por usuário e payloads
+# de poucos MB por chamada; a planilha inteira aceita até 10 milhões de células
+MAX_CELULAS_POR_CHAMADA = 50000
+LIMITE_CELULAS = 10_000_000
+STATUS_REPETIR = (429, 500, 502, 503, 504)
+# Cada aba aceita um só modo: anexos (com cabeçalho) ou substituição da tabela
+MODOS = {"cabecalho": "anexar", "anexar": "anexar", "substituir": "substituir"}
+
+def _coluna(n):
+    """Número da coluna (1 = A) para a letra usada na notação A1."""
+    letras = ""
+    while n > 0:
+        n, resto = divmod(n - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+def _faixa(linha_inicio, linha_fim, colunas):
+    return f"A{linha_inicio}:{_coluna(max(colunas, 1))}{linha_fim}"
+
+def _normalizar(linha):
+    # Como a célula volta do Sheets (get_all_values), sem as vazias do fim
+    valores = ["" if valor is None else str(valor) for valor in linha]
+    while valores and valores[-1] == "":
+        valores.pop()
+    return valores
+
+def _status_http(erro):
+    # gspread.exceptions.APIError guarda a resposta do requests
+    resposta = getattr(erro, "response", None)
+    return getattr(resposta, "status_code", None) or getattr(erro, "code", None)
+
+def _transitorio(erro):
+    # Cota, erro do servidor ou rede: vale tentar de novo sem limite
+    return _status_http(erro) in STATUS_REPETIR or isinstance(erro, OSError)
+
+def _em_blocos(linhas, colunas, max_celulas):
+    tamanho = max(1, max_celulas // max(colunas, 1))
+    for inicio in range(0, len(linhas), tamanho):
+        yield inicio, linhas[inicio:inicio + tamanho]
+
+# ---------------------- Redução perto do limite de células ----------------------
+def amostrar(linhas, fator=2):
+    """Mantém uma a cada `fator` linhas."""
+    return linhas[::fator]
+
+def agregar_media(linhas, tamanho_grupo=2):
+    """Junta cada `tamanho_grupo` linhas em uma: média nas colunas numéricas, primeiro valor nas demais."""
+    agregadas = []
+    for inicio in range(0, len(linhas), tamanho_grupo):
+        grupo = linhas[inicio:inicio + tamanho_grupo]
+        linha = []
+        for coluna in range(max(len(l) for l in grupo)):
+            valores = [l[coluna] if coluna < len(l) else "" for l in grupo]
+            try:
+                numeros = [float(v) for v in valores]
+            except (TypeError, ValueError):
+                linha.append(valores[0])
+            else:
+                linha.append(round(sum(numeros) / len(numeros), 4))
+        agregadas.append(linha)
+    return agregadas
+
+# ---------------------- Fila compartilhada ----------------------
+class FilaSheets:
+    """Fila de escritas no Sheets guardada num SQLite compartilhado pelos pollers.
+
+    Os pollers só enfileiram (`anexar`, `substituir`) e seguem; um
+    `EscritorSheets` drena a fila. Cada chamada abre a própria conexão,
+    então a fila pode ser usada de várias threads e processos.
+
+    A primeira escrita numa aba fixa o modo dela (anexar ou substituir);
+    misturar os dois levanta ValueError, porque um `substituir` apagaria as
+    linhas anexadas por outro produtor. `redefinir_modo` libera a aba.
+    """
+
+    def __init__(self, caminho="fila_sheets.sqlite3"):
+        self.caminho = caminho
+        self._local = threading.local()
+        with self._conectar() as conexao:
+            conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS operacoes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    planilha TEXT NOT NULL,
+                    aba TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    linhas TEXT NOT NULL,
+                    criado REAL NOT NULL,
+                    tentativas INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS quarentena (
+                    id INTEGER PRIMARY KEY,
+                    planilha TEXT NOT NULL,
+                    aba TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    linhas TEXT NOT NULL,
+                    criado REAL NOT NULL,
+                    tentativas INTEGER NOT NULL,
+                    erro TEXT
+                );
+                CREATE TABLE IF NOT EXISTS modos (
+                    planilha TEXT NOT NULL,
+                    aba TEXT NOT NULL,
+                    modo TEXT NOT NULL,
+                    PRIMARY KEY (planilha, aba)
+                );
+                CREATE TABLE IF NOT EXISTS dono (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    processo TEXT NOT NULL,
+                    ate REAL NOT NULL
+                );
+            """)
+            # Filas criadas antes da contagem de tentativas
+            colunas = [linha[1] for linha in conexao.execute("PRAGMA table_info(operacoes)")]
+            if "tentativas" not in colunas:
+                conexao.execute("ALTER TABLE operacoes ADD COLUMN tentativas INTEGER NOT NULL DEFAULT 0")
+
+    def _conectar(self):
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    @contextlib.contextmanager
+    def transacao(self):
+        """Tudo o que for enfileirado dentro do bloco entra na fila de uma vez, no fim.
+
+        Se o bloco levantar exceção, nada entra. Enquanto o bloco roda, as
+        operações ficam num arquivo temporário, não na memória nem no SQLite:
+        o lock de escrita só é pego no fim, numa transação curta que insere o
+        que foi preparado, e os outros pollers e o escritor não esperam o
+        download terminar.
+        """
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as preparadas:
+            self._local.preparadas = preparadas
+            try:
+                yield self
+            finally:
+                self._local.preparadas = None
+            preparadas.seek(0)
+            with self._conectar() as conexao:
+                for linha in preparadas:
+                    self._inserir(conexao, *json.loads(linha))
+
+    def _enfileirar(self, planilha, aba, operacoes):
+        preparadas = getattr(self._local, "preparadas", None)
+        if preparadas is not None:
+            preparadas.write(json.dumps([planilha, aba, operacoes], ensure_ascii=False) + "\n")
+            return
+        with self._conectar() as conexao:
+            self._inserir(conexao, planilha, aba, operacoes)
+
+    def _inserir(self, conexao, planilha, aba, operacoes):
+        self._conferir_modo(conexao, planilha, aba, operacoes)
+        agora = time.time()
+        conexao.executemany(
+            "INSERT INTO operacoes (planilha, aba, tipo, linhas, criado) VALUES (?, ?, ?, ?, ?)",
+            [(planilha, aba, tipo, json.dumps(linhas, ensure_ascii=False), agora) for tipo, linhas in operacoes]
+        )
+
+    def _conferir_modo(self, conexao, planilha, aba, operacoes):
+        modo = MODOS[operacoes[0][0]]
+        conexao.execute(
+            "INSERT OR IGNORE INTO modos (planilha, aba, modo) VALUES (?, ?, ?)", (planilha, aba, modo)
+        )
+        atual, = conexao.execute(
+            "SELECT modo FROM modos WHERE planilha = ? AND aba = ?", (planilha, aba)
+        ).fetchone()
+        if atual != modo:
+            raise ValueError(
+                f"A aba {aba} é escrita no modo '{atual}'; '{modo}' apagaria ou embaralharia as linhas "
+                f"do outro produtor. Use outra aba (ou redefinir_modo)."
+            )
+
+    def redefinir_modo(self, planilha, aba):
+        with self._conectar() as conexao:
+            conexao.execute("DELETE FROM modos WHERE planilha = ? AND aba = ?", (planilha, aba))
+
+    def anexar(self, planilha, aba, linhas, cabecalho=None):
+        """Acrescenta `linhas` no fim da aba; `cabecalho` (se dado) vira a linha 1."""
+        operacoes = [("cabecalho", [list(cabecalho)])] if cabecalho is not None else []
+        if linhas:
+            operacoes.append(("anexar", [list(linha) for linha in linhas]))
+        if operacoes:
+            self._enfileirar(planilha, aba, operacoes)
+
+    def substituir(self, planilha, aba, linhas):
+        """Troca todo o conteúdo da aba por `linhas` (só o que mudou é reescrito)."""
+        self._enfileirar(planilha, aba, [("substituir", [list(linha) for linha in linhas])])
+
+    def pendentes(self, limite=1000, excluir=()):
+        """Operações na ordem em que chegaram, menos as das abas (planilha, aba) em `excluir`."""
+        filtro = "".join(" AND NOT (planilha = ? AND aba = ?)" for _ in excluir)
+        parametros = [valor for par in excluir for valor in par] + [limite]
+        with self._conectar() as conexao:
+            return [
+                (id_, planilha, aba, tipo, json.loads(linhas))
+                for id_, planilha, aba, tipo, linhas in conexao.execute(
+                    f"SELECT id, planilha, aba, tipo, linhas FROM operacoes WHERE 1{filtro} ORDER BY id LIMIT ?",
+                    parametros
+                )
+            ]
+
+    def registrar_falha(self, ids, erro, max_tentativas):
+        """Conta uma falha para `ids`; as que chegarem a `max_tentativas` vão para a quarentena.
+
+        Devolve quantas foram isoladas. Elas ficam na tabela `quarentena` para
+        inspeção e podem voltar para `operacoes` à mão.
+        """
+        marcadores = ",".join("?" * len(ids))
+        with self._conectar() as conexao:
+            conexao.execute(f"UPDATE operacoes SET tentativas = tentativas + 1 WHERE id IN ({marcadores})", ids)
+            conexao.execute(f"""
+                INSERT INTO quarentena (id, planilha, aba, tipo, linhas, criado, tentativas, erro)
+                SELECT id, planilha, aba, tipo, linhas, criado, tentativas, ? FROM operacoes
+                WHERE id IN ({marcadores}) AND tentativas >= ?
+            """, [erro, *ids, max_tentativas])
+            cursor = conexao.execute(
+                f"DELETE FROM operacoes WHERE id IN ({marcadores}) AND tentativas >= ?", [*ids, max_tentativas]
+            )
+            return cursor.rowcount
+
+    def confirmar(self, ids):
+        with self._conectar() as conexao:
+            conexao.executemany("DELETE FROM operacoes WHERE id = ?", [(id_,) for id_ in ids])
+
+    def assumir(self, processo, validade):
+        """Tenta ser o único escritor por `validade` segundos (ou renovar); True se conseguiu."""
+        agora = time.time()
+        with self._conectar() as conexao:
+            cursor = conexao.execute("""
+                INSERT INTO dono (id, processo, ate) VALUES (1, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET processo = excluded.processo, ate = excluded.ate
+                WHERE dono.ate < ? OR dono.processo = excluded.processo
+            """, (processo, agora + validade, agora))
+            return cursor.rowcount == 1
+
+    def liberar(self, processo):
+        with self._conectar() as conexao:
+            conexao.execute("DELETE FROM dono WHERE id = 1 AND processo = ?", (processo,))
+
+def coalescer(operacoes):
+    """Junta as operações pendentes de uma aba no menor número de ações.
+
+    Anexos seguidos viram um só; um `substituir` descarta tudo o que veio
+    antes, e o que vier depois dele é aplicado em cima da própria tabela.
+    Cabeçalhos só mexem na linha 1: ficam na posição do primeiro, com o
+    valor do último, e os anexos entre eles se juntam.
+    """
+    acoes = []
+    cabecalho = None
+    for tipo, linhas in operacoes:
+        ultima = acoes[-1] if acoes else None
+        if tipo == "substituir":
+            acoes = [["substituir", [list(l) for l in linhas]]]
+            cabecalho = None
+        elif ultima and ultima[0] == "substituir":
+            tabela = ultima[1]
+            if tipo == "anexar":
+                tabela.extend(linhas)
+            elif tabela:
+                tabela[0] = linhas[0]
+            else:
+                tabela.append(linhas[0])
+        elif ultima and ultima[0] == tipo == "anexar":
+            ultima[1].extend(linhas)
+        elif tipo == "cabecalho" and cabecalho is not None:
+            cabecalho[1] = linhas
+        else:
+            acoes.append([tipo, list(linhas)])
+            if tipo == "cabecalho":
+                cabecalho = acoes[-1]
+    return [tuple(acao) for acao in acoes]
+
+# ---------------------- Abertura das abas ----------------------
+def abrir_aba_gspread(gc, linhas=1000, colunas=26):
+    """`abrir_aba` para o EscritorSheets a partir de um cliente do gspread.
+
+    Se a aba não existir na planilha, ela é criada (com a grade padrão do
+    Sheets) em vez de cada escrita falhar com WorksheetNotFound.
+    """
+    import gspread
+
+    def abrir_aba(planilha, aba):
+        documento = gc.open_by_key(planilha)
+        try:
+            return documento.worksheet(aba)
+        except gspread.exceptions.WorksheetNotFound:
+            print(f"📄 Aba {aba} não existe; criando.")
+            return documento.add_worksheet(title=aba, rows=linhas, cols=colunas)
+    return abrir_aba
+
+# ---------------------- Escritor ----------------------
+class _EstadoAba:
+    """O que o escritor sabe de uma aba: objeto da API, conteúdo escrito e tamanho da grade."""
+
+    def __init__(self, aba):
+        self.aba = aba
+        self.conteudo = None  # linhas normalizadas; None = ainda não lido
+        self.cabecalho = None
+        self.linhas_grade = getattr(aba, "row_count", 0)
+        self.colunas_grade = getattr(aba, "col_count", 0)
+
+    @property
+    def celulas(self):
+        return self.linhas_grade * self.colunas_grade
+
+class EscritorSheets:
+    """Drena uma `FilaSheets` e aplica as escritas com o mínimo de chamadas.
+
+    `abrir_aba(planilha, aba)` devolve a aba no formato do gspread; só são
+    usados `append_rows`, `update`, `batch_update`, `batch_clear`,
+    `get_all_values`, `row_values`, `resize` e `row_count`/`col_count`, então
+    um objeto falso com esses métodos serve nos testes.
+
+    - anexos só acrescentam linhas (`append_rows` com INSERT_ROWS);
+    - `substituir` compara com o conteúdo atual e reescreve só as faixas de
+      linhas que mudaram, limpando as que sobraram no fim;
+    - cada chamada leva no máximo `max_celulas_por_chamada` células e há um
+      intervalo mínimo entre chamadas; 429 e 5xx são repetidos com backoff
+      exponencial com jitter;
+    - se um anexo fizer a aba passar de `margem` x `limite_celulas`, a
+      metade mais antiga das linhas é reduzida com `reduzir` (por padrão
+      `amostrar`; `agregar_media` é a alternativa) antes de anexar.
+
+    Vários processos podem rodar um escritor na mesma fila: só o dono do
+    lock (`FilaSheets.assumir`) escreve. As operações saem da fila depois de
+    aplicadas; se o processo cair no meio, um anexo pode ser repetido.
+
+    Uma aba com erro não trava as outras. Erros transitórios (429, 5xx,
+    rede) são repetidos sem limite; os demais (400 de faixa inválida, aba
+    apagada...) contam uma tentativa para as operações do grupo, que vão
+    para a quarentena depois de `max_tentativas_operacao` falhas.
+    """
+
+    def __init__(self, fila, abrir_aba, intervalo=5.0, intervalo_minimo=1.0,
+                 max_celulas_por_chamada=MAX_CELULAS_POR_CHAMADA, limite_celulas=LIMITE_CELULAS,
+                 margem=0.9, reduzir=amostrar, max_tentativas=8, espera_inicial=1.0,
+                 espera_maxima=64.0, validade_dono=300.0, max_tentativas_operacao=5):
+        self.fila = fila
+        self.abrir_aba = abrir_aba
+        self.intervalo = intervalo
+        self.intervalo_minimo = intervalo_minimo
+        self.max_celulas_por_chamada = max_celulas_por_chamada
+        self.limite_celulas = limite_celulas
+        self.margem = margem
+        self.reduzir = reduzir
+        self.max_tentativas = max_tentativas
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.validade_dono = validade_dono
+        self.max_tentativas_operacao = max_tentativas_operacao
+
+        self.processo = uuid.uuid4().hex
+        self.chamadas = 0
+        self._abas = {}
+        self._dono = False
+        self._proxima_chamada = 0.0
+        self._parar = threading.Event()
+        self._thread = None
+
+    # ---------------------- Chamadas à API ----------------------
+    def _chamar(self, funcao, *args, **kwargs):
+        for tentativa in range(self.max_tentativas):
+            espera = self._proxima_chamada - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            try:
+                self.chamadas += 1
+                return funcao(*args, **kwargs)
+            except Exception as e:
+                status = _status_http(e)
+                if status not in STATUS_REPETIR or tentativa == self.max_tentativas - 1:
+                    raise
+                atraso = min(self.espera_maxima, self.espera_inicial * 2 ** tentativa) * (1 + random.random())
+                print(f"⏳ Sheets respondeu {status}; nova tentativa em {atraso:.1f}s")
+                time.sleep(atraso)
+            finally:
+                self._proxima_chamada = time.monotonic() + self.intervalo_minimo
+
+    def _estado(self, planilha, aba):
+        if (planilha, aba) not in self._abas:
+            self._abas[(planilha, aba)] = _EstadoAba(self.abrir_aba(planilha, aba))
+        return self._abas[(planilha, aba)]
+
+    def _carregar(self, estado):
+        if estado.conteudo is None:
+            estado.conteudo = [_normalizar(l) for l in self._chamar(estado.aba.get_all_values)]
+            estado.cabecalho = estado.conteudo[0] if estado.conteudo else []
+        return estado.conteudo
+
+    # ---------------------- Ações ----------------------
+    def _cabecalho(self, estado, cabecalho):
+        novo = _normalizar(cabecalho)
+        if estado.cabecalho is None:
+            estado.cabecalho = _normalizar(self._chamar(estado.aba.row_values, 1))
+        if estado.cabecalho == novo:
+            return
+        largura = max(len(novo), len(estado.cabecalho))
+        self._chamar(
+            estado.aba.update,
+            range_name=_faixa(1, 1, largura),
+            values=[list(cabecalho) + [""] * (largura - len(cabecalho))]
+        )
+        estado.cabecalho = novo
+        estado.colunas_grade = max(estado.colunas_grade, largura)
+        if estado.conteudo is not None:
+            if estado.conteudo:
+                estado.conteudo[0] = novo
+            else:
+                estado.conteudo.append(novo)
+
+    def _anexar(self, estado, linhas):
+        colunas = max(max(len(l) for l in linhas), estado.colunas_grade)
+        if (estado.linhas_grade + len(linhas)) * colunas > self.limite_celulas * self.margem:
+            if not self._compactar(estado, len(linhas), colunas):
+                print(f"⚠️ Aba {getattr(estado.aba, 'title', '')} no limite de células e sem o que reduzir")
+
+        largura = max(len(l) for l in linhas)
+        for _, bloco in _em_blocos(linhas, largura, self.max_celulas_por_chamada):
+            self._chamar(
+                estado.aba.append_rows, bloco,
+                value_input_option="RAW", insert_data_option="INSERT_ROWS", table_range="A1"
+            )
+            estado.linhas_grade += len(bloco)
+            if estado.conteudo is not None:
+                estado.conteudo.extend(_normalizar(l) for l in bloco)
+        estado.colunas_grade = max(estado.colunas_grade, largura)
+
+    def _substituir(self, estado, linhas):
+        atual = self._carregar(estado)
+        normalizadas = [_normalizar(l) for l in linhas]
+
+        # Faixas contíguas de linhas que mudaram
+        faixas = []
+        for i, nova in enumerate(normalizadas):
+            if i < len(atual) and atual[i] == nova:
+                continue
+            if faixas and faixas[-1][1] == i:
+                faixas[-1][1] = i + 1
+            else:
+                faixas.append([i, i + 1])
+
+        dados = []
+        for inicio, fim in faixas:
+            largura = max(
+                max(len(normalizadas[i]) for i in range(inicio, fim)),
+                max((len(atual[i]) for i in range(inicio, min(fim, len(atual)))), default=0)
+            )
+            # Completa com "" para apagar células que sobrariam da versão anterior
+            bloco = [list(linhas[i]) + [""] * (largura - len(linhas[i])) for i in range(inicio, fim)]
+            for deslocamento, parte in _em_blocos(bloco, largura, self.max_celulas_por_chamada):
+                primeira = inicio + deslocamento + 1
+                dados.append({"range": _faixa(primeira, primeira + len(parte) - 1, largura), "values": parte})
+
+        # Agrupa as faixas em chamadas de até max_celulas_por_chamada
+        lote, celulas = [], 0
+        for item in dados:
+            tamanho = len(item["values"]) * len(item["values"][0])
+            if lote and celulas + tamanho > self.max_celulas_por_chamada:
+                self._chamar(estado.aba.batch_update, lote, value_input_option="RAW")
+                lote, celulas = [], 0
+            lote.append(item)
+            celulas += tamanho
+        if lote:
+            self._chamar(estado.aba.batch_update, lote, value_input_option="RAW")
+
+        if len(atual) > len(normalizadas):
+            largura = max(len(l) for l in atual[len(normalizadas):]) or 1
+            self._chamar(estado.aba.batch_clear, [_faixa(len(normalizadas) + 1, len(atual), largura)])
+
+        estado.conteudo = normalizadas
+        estado.cabecalho = normalizadas[0] if normalizadas else []
+        estado.linhas_grade = max(estado.linhas_grade, len(normalizadas))
+        estado.colunas_grade = max([estado.colunas_grade] + [len(l) for l in normalizadas])
+
+    def _compactar(self, estado, linhas_a_mais, colunas):
+        """Reduz as linhas mais antigas até caber `linhas_a_mais`; False se não couber."""
+        maximo = int(self.limite_celulas * self.margem) // colunas - linhas_a_mais
+        atual = self._carregar(estado)
+        compactado = atual
+        # Reduz em memória a metade mais antiga quantas vezes for preciso e escreve uma vez só
+        while len(compactado) > maximo:
+            cabecalho, dados = compactado[:1], compactado[1:]
+            metade = len(dados) // 2
+            reduzido = cabecalho + self.reduzir(dados[:metade]) + dados[metade:]
+            if len(reduzido) >= len(compactado):
+                break
+            compactado = reduzido
+        if len(compactado) < len(atual):
+            print(f"🗜️ Aba perto do limite ({estado.celulas} células na grade); "
+                  f"{len(atual)} -> {len(compactado)} linhas")
+            self._substituir(estado, compactado)
+        # A grade é que conta para o limite: encolhe até o conteúdo
+        if estado.linhas_grade > len(compactado):
+            self._chamar(estado.aba.resize, rows=max(len(compactado), 1))
+            estado.linhas_grade = max(len(compactado), 1)
+        return len(compactado) <= maximo
+
+    def _aplicar(self, planilha, aba, acoes):
+        estado = self._estado(planilha, aba)
+        for tipo, linhas in acoes:
+            if tipo == "cabecalho":
+                self._cabecalho(estado, linhas[0])
+            elif tipo == "anexar":
+                self._anexar(estado, linhas)
+            else:
+                self._substituir(estado, linhas)
+
+    # ---------------------- Laço ----------------------
+    def descarregar(self):
+        """Aplica tudo o que está na fila, se este processo for o dono; devolve quantas operações saíram."""
+        dono = self.fila.assumir(self.processo, self.validade_dono)
+        if dono and not self._dono:
+            # Outro processo pode ter escrito enquanto não éramos o dono
+            self._abas.clear()
+        self._dono = dono
+        if not dono:
+            return 0
+
+        total = 0
+        com_falha = []
+        while True:
+            operacoes = self.fila.pendentes(excluir=com_falha)
+            if not operacoes:
+                return total
+            por_aba = {}
+            for id_, planilha, aba, tipo, linhas in operacoes:
+                por_aba.setdefault((planilha, aba), []).append((id_, tipo, linhas))
+            for (planilha, aba), itens in por_aba.items():
+                acoes = coalescer([(tipo, linhas) for _, tipo, linhas in itens])
+                try:
+                    self._aplicar(planilha, aba, acoes)
+                except Exception as e:
+                    # O estado em memória pode ter ficado pela metade
+                    self._abas.pop((planilha, aba), None)
+                    # A aba fica para o próximo ciclo; as outras seguem
+                    com_falha.append((planilha, aba))
+                    print(f"Erro ao escrever na aba {aba}: {e!r}")
+                    if not _transitorio(e):
+                        isoladas = self.fila.registrar_falha(
+                            [id_ for id_, _, _ in itens], repr(e), self.max_tentativas_operacao
+                        )
+                        if isoladas:
+                            print(f"🚫 {isoladas} operações da aba {aba} foram para a quarentena")
+                    continue
+                self.fila.confirmar([id_ for id_, _, _ in itens])
+                total += len(itens)
+                print(f"📝 {aba}: {len(itens)} escritas -> {len(acoes)} ações ({self.chamadas} chamadas à API)")
+                self.fila.assumir(self.processo, self.validade_dono)
+
+    def executar(self):
+        while not self._parar.is_set():
+            try:
+                self.descarregar()
+            except Exception as e:
+                print(f"Erro ao escrever no Sheets: {e}")
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        """Roda o escritor numa thread em segundo plano."""
+        self._thread = threading.Thread(target=self.executar, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self, descarregar=True):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+        if descarregar:
+            self.descarregar()
+        self.fila.liberar(self.processo)
+        self._dono = False
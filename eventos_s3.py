@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus, urlparse
+
+import boto3
+
+def criar_cliente_sqs(url_fila, **credenciais):
+    """Cliente SQS na região da fila; SQS_ENDPOINT_URL aponta para um SQS local nos testes."""
+    regiao = re.match(r"sqs\.([a-z0-9-]+)\.amazonaws\.com", urlparse(url_fila).netloc)
+    return boto3.client(
+        'sqs',
+        region_name=regiao.group(1) if regiao else os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+        endpoint_url=os.environ.get('SQS_ENDPOINT_URL'),
+        **credenciais
+    )
+
+def extrair_objetos(corpo):
+    """(bucket, chave, horário do evento) de cada objeto criado numa mensagem SQS.
+
+    Aceita a notificação direta do S3, a mesma embrulhada pelo SNS e o
+    formato do EventBridge. O s3:TestEvent (enviado ao configurar a
+    notificação) e eventos que não são de criação (remoção, por exemplo)
+    devolvem lista vazia.
+    """
+    evento = json.loads(corpo)
+    if "Message" in evento and "Records" not in evento:
+        evento = json.loads(evento["Message"])
+
+    if "detail" in evento:
+        if evento.get("detail-type") != "Object Created":
+            return []
+        detalhe = evento["detail"]
+        return [(detalhe["bucket"]["name"], detalhe["object"]["key"], evento.get("time"))]
+
+    objetos = []
+    for registro in evento.get("Records", []):
+        if not registro.get("eventName", "").startswith("ObjectCreated"):
+            continue
+        # A chave vem URL-encoded (espaço vira '+')
+        objetos.append((
+            registro["s3"]["bucket"]["name"],
+            unquote_plus(registro["s3"]["object"]["key"]),
+            registro.get("eventTime"),
+        ))
+    return objetos
+
+def _atraso_desde(horario_evento):
+    if not horario_evento:
+        return None
+    inicio = datetime.fromisoformat(horario_evento.replace("Z", "+00:00"))
+    return (datetime.now(timezone.utc) - inicio).total_seconds()
+
+def _recebimentos(mensagem):
+    return int(mensagem.get("Attributes", {}).get("ApproximateReceiveCount", 1))
+
+def _descartar(sqs, url_fila_falhas, mensagem):
+    """Tira da fila uma mensagem que falhou demais; True se ela pode ser apagada."""
+    if url_fila_falhas:
+        try:
+            sqs.send_message(QueueUrl=url_fila_falhas, MessageBody=mensagem["Body"])
+        except Exception as e:
+            print(f'Erro ao mover mensagem {mensagem["MessageId"]} para a fila de falhas: {e}')
+            return False
+        print(f'🗑️ Mensagem {mensagem["MessageId"]} movida para a fila de falhas')
+    else:
+        print(f'🗑️ Mensagem {mensagem["MessageId"]} descartada depois de muitas falhas: {mensagem["Body"][:500]}')
+    return True
+
+def consumir_eventos(sqs, url_fila, tratar, reconciliar=None, intervalo_reconciliacao=900,
+                     espera=20, max_mensagens=10, parar=None, max_recebimentos=5, url_fila_falhas=None):
+    """Processa objetos novos assim que a notificação chega na fila.
+
+    Usa long polling (`espera` segundos, até `max_mensagens` por chamada) e
+    apaga as mensagens em lote, só depois que `tratar(bucket, chave)` rodou
+    sem erro para todos os objetos delas; as que falharem voltam para a
+    fila quando o visibility timeout expirar. `reconciliar()` roda no início
+    e a cada `intervalo_reconciliacao` segundos, para pegar o que tenha se
+    perdido das notificações (a listagem vira só a varredura de segurança).
+
+    Uma mensagem que falhou em `max_recebimentos` entregas sai da fila,
+    copiada antes para `url_fila_falhas` se houver, para um objeto com
+    problema não voltar para sempre. (Uma redrive policy com DLQ na própria
+    fila faz o mesmo do lado da AWS.)
+    """
+    parar = parar or threading.Event()
+    ultima_reconciliacao = None
+
+    while not parar.is_set():
+        if reconciliar and (ultima_reconciliacao is None or time.monotonic() - ultima_reconciliacao >= intervalo_reconciliacao):
+            try:
+                reconciliar()
+            except Exception as e:
+                print(f'Erro na varredura de reconciliação: {e}')
+            ultima_reconciliacao = time.monotonic()
+
+        try:
+            resposta = sqs.receive_message(
+                QueueUrl=url_fila,
+                MaxNumberOfMessages=max_mensagens,
+                WaitTimeSeconds=espera,
+                AttributeNames=["ApproximateReceiveCount"]
+            )
+        except Exception as e:
+            print(f'Erro ao ler a fila: {e}')
+            parar.wait(5)
+            continue
+
+        concluidas = []
+        for mensagem in resposta.get("Messages", []):
+            try:
+                for bucket, chave, horario_evento in extrair_objetos(mensagem["Body"]):
+                    tratar(bucket, chave)
+                    atraso = _atraso_desde(horario_evento)
+                    if atraso is not None:
+                        print(f'⚡ {chave} processado {atraso:.1f}s após o upload')
+            except Exception as e:
+                recebimentos = _recebimentos(mensagem)
+                print(f'Erro ao processar mensagem {mensagem["MessageId"]} ({recebimentos}ª entrega): {e}')
+                if recebimentos < max_recebimentos:
+                    continue
+                if not _descartar(sqs, url_fila_falhas, mensagem):
+                    continue
+            concluidas.append({"Id": str(len(concluidas)), "ReceiptHandle": mensagem["ReceiptHandle"]})
+
+        if concluidas:
+            resultado = sqs.delete_message_batch(QueueUrl=url_fila, Entries=concluidas)
+            for falha in resultado.get("Failed", []):
+                print(f'Falha ao apagar mensagem da fila: {falha.get("Message", falha)}')
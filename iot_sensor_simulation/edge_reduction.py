@@ -0,0 +1,226 @@
+import numpy as np
+
+# ---------------------- Redução na borda ----------------------
+# Dois modos para reduzir o fluxo de leituras antes de enviar:
+#   - deadband (report-by-exception): um sensor só emite quando o valor se
+#     afasta mais que `threshold` do último valor emitido;
+#   - window: em vez dos pontos, emite min/max/média/contagem por janela.
+# Os dois trabalham sobre arrays (ticks, séries) e guardam estado entre
+# chamadas, então podem ser aplicados batch a batch sobre um fluxo contínuo.
+
+REDUCTION_MODES = ("raw", "deadband", "window")
+
+def angular_difference(a, b):
+    """Diferença a - b em graus, no intervalo [-180, 180): 359° e 1° distam 2°."""
+    return np.mod(a - b + 180, 360) - 180
+
+def _wrap_mask(wrap, n_series):
+    # `wrap`: máscara booleana ou índices das séries angulares, como SensorFleet.wrap_mask
+    mask = np.zeros(n_series, dtype=bool)
+    if wrap is not None:
+        mask[np.asarray(wrap)] = True
+    return mask
+
+class _ReductionStats:
+    """Contagem de valores brutos x emitidos e erro de reconstrução."""
+
+    mode = "raw"
+
+    def __init__(self):
+        self.raw_values = 0
+        self.emitted_values = 0
+        self.squared_error = 0.0
+        self.max_abs_error = 0.0
+
+    def stats(self):
+        ratio = self.raw_values / self.emitted_values if self.emitted_values else float("inf")
+        rmse = float(np.sqrt(self.squared_error / self.raw_values)) if self.raw_values else 0.0
+        return {
+            "mode": self.mode,
+            "raw_values": self.raw_values,
+            "emitted_values": self.emitted_values,
+            "reduction_ratio": ratio,
+            "max_abs_error": self.max_abs_error,
+            "rmse": rmse,
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(
+            f"Redução ({stats['mode']}): {stats['raw_values']} valores brutos -> "
+            f"{stats['emitted_values']} emitidos ({stats['reduction_ratio']:.1f}x) | "
+            f"erro máx {stats['max_abs_error']:.4f} | RMSE {stats['rmse']:.4f}"
+        )
+        return stats
+
+class DeadbandReducer(_ReductionStats):
+    """Report-by-exception por série.
+
+    `threshold` pode ser um número ou um array com um limiar por série. Com
+    `max_silence`, a série emite de qualquer forma depois de tantos ticks
+    calada (heartbeat). O erro é medido contra a reconstrução do consumidor,
+    que repete o último valor recebido; por construção fica <= threshold.
+    Nas séries de `wrap` (direção do vento) o desvio é angular.
+    """
+
+    mode = "deadband"
+
+    def __init__(self, threshold, max_silence=None, wrap=None):
+        super().__init__()
+        self.threshold = threshold
+        self.max_silence = max_silence
+        self.wrap = wrap
+        self.last_emitted = None
+        self.silent_ticks = None
+
+    def reduce(self, values):
+        """Devolve a máscara (ticks, séries) dos valores que devem ser emitidos."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[None, :]
+        mask = np.empty(values.shape, dtype=bool)
+        if self.last_emitted is None:
+            self.last_emitted = np.full(values.shape[1], np.nan)
+            self.silent_ticks = np.zeros(values.shape[1], dtype=np.int64)
+            self.wrap = _wrap_mask(self.wrap, values.shape[1])
+
+        # Dependência sequencial (cada decisão depende do último emitido), então
+        # o laço é por tick, vetorizado entre as séries
+        for tick, row in enumerate(values):
+            deviation = np.abs(np.where(
+                self.wrap, angular_difference(row, self.last_emitted), row - self.last_emitted
+            ))
+            emit = ~(deviation <= self.threshold)  # NaN (primeira leitura) emite
+            if self.max_silence is not None:
+                emit |= self.silent_ticks >= self.max_silence
+            mask[tick] = emit
+            self.last_emitted = np.where(emit, row, self.last_emitted)
+            self.silent_ticks = np.where(emit, 0, self.silent_ticks + 1)
+
+            suppressed = deviation[~emit]
+            if suppressed.size:
+                self.squared_error += float(np.dot(suppressed, suppressed))
+                self.max_abs_error = max(self.max_abs_error, float(suppressed.max()))
+
+        self.raw_values += values.size
+        self.emitted_values += int(mask.sum())
+        return mask
+
+class WindowReducer(_ReductionStats):
+    """Resumo por janela fixa de `window_seconds`: min, max, média e contagem por série.
+
+    `reduce` recebe timestamps datetime64 em ordem e devolve as janelas que
+    fecharam; a janela aberta fica guardada até chegar um tick de outra
+    janela ou até `flush`. Cada janela conta como 4 valores emitidos por
+    série, e o erro é medido contra a média da janela.
+
+    Nas séries de `wrap` (direção do vento) a média é circular e o erro é o
+    desvio angular até ela; min/max são as pontas do arco que contém as
+    leituras (min > max quando o arco passa por 0°). Para isso as leituras
+    dessas séries ficam guardadas até a janela fechar.
+    """
+
+    mode = "window"
+
+    def __init__(self, window_seconds=60, wrap=None):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.window_us = int(window_seconds * 1_000_000)
+        self.wrap = wrap
+        self._wrap_mask = None
+        self._open = None
+
+    def reduce(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype="datetime64[us]")
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[None, :]
+        if not len(timestamps):
+            return []
+        if self._wrap_mask is None:
+            self._wrap_mask = _wrap_mask(self.wrap, values.shape[1])
+
+        window_ids = timestamps.astype(np.int64) // self.window_us
+        starts = np.flatnonzero(np.r_[True, window_ids[1:] != window_ids[:-1]])
+        counts = np.diff(np.r_[starts, len(window_ids)])
+        angles = values[:, self._wrap_mask]
+        groups = zip(
+            starts.tolist(),
+            window_ids[starts].tolist(),
+            counts.tolist(),
+            np.minimum.reduceat(values, starts, axis=0),
+            np.maximum.reduceat(values, starts, axis=0),
+            np.add.reduceat(values, starts, axis=0),
+            np.add.reduceat(values * values, starts, axis=0),
+        )
+
+        closed = []
+        for start, window_id, count, minimum, maximum, total, squares in groups:
+            window_angles = angles[start:start + count]
+            if self._open is not None and self._open["id"] == window_id:
+                current = self._open
+                current["count"] += count
+                current["min"] = np.minimum(current["min"], minimum)
+                current["max"] = np.maximum(current["max"], maximum)
+                current["sum"] += total
+                current["squares"] += squares
+                current["angles"].append(window_angles)
+                continue
+            if self._open is not None:
+                closed.append(self._close())
+            self._open = {
+                "id": window_id, "count": count, "min": minimum, "max": maximum,
+                "sum": total, "squares": squares, "angles": [window_angles],
+            }
+
+        self.raw_values += values.size
+        return closed
+
+    def flush(self):
+        return [self._close()] if self._open is not None else []
+
+    def _close(self):
+        current, self._open = self._open, None
+        count = current["count"]
+        mean = current["sum"] / count
+        minimum, maximum = current["min"], current["max"]
+        # Soma dos quadrados dos desvios e maior desvio em relação à média da janela
+        squared_error = np.maximum(current["squares"] - count * mean * mean, 0.0)
+        abs_error = np.maximum(maximum - mean, mean - minimum)
+
+        wrap = self._wrap_mask
+        if wrap.any():
+            angles = np.concatenate(current["angles"])
+            radians = np.deg2rad(angles)
+            circular_mean = np.mod(np.rad2deg(np.arctan2(np.sin(radians).sum(axis=0), np.cos(radians).sum(axis=0))), 360)
+            deviation = angular_difference(angles, circular_mean)
+            mean[wrap] = circular_mean
+            minimum[wrap] = np.mod(circular_mean + deviation.min(axis=0), 360)
+            maximum[wrap] = np.mod(circular_mean + deviation.max(axis=0), 360)
+            squared_error[wrap] = (deviation * deviation).sum(axis=0)
+            abs_error[wrap] = np.abs(deviation).max(axis=0)
+
+        self.squared_error += float(squared_error.sum())
+        self.max_abs_error = max(self.max_abs_error, float(np.max(abs_error)))
+        self.emitted_values += 4 * mean.size
+        return {
+            "window_start": np.datetime64(current["id"] * self.window_us, "us"),
+            "window_seconds": self.window_seconds,
+            "count": count,
+            "min": minimum,
+            "max": maximum,
+            "mean": np.round(mean, 2),
+        }
+
+def build_reducer(mode, deadband=0.5, max_silence=None, window_seconds=60, wrap=None):
+    """Cria o redutor do modo pedido; None para "raw" (sem redução).
+
+    `wrap` marca as séries angulares (máscara booleana ou índices).
+    """
+    if mode in (None, "raw"):
+        return None
+    if mode == "deadband":
+        return DeadbandReducer(deadband, max_silence, wrap)
+    if mode == "window":
+        return WindowReducer(window_seconds, wrap)
+    raise ValueError(f"Modo de redução inválido: {mode} (use {', '.join(REDUCTION_MODES)})")
@@ -1,12 +1,31 @@
 import numpy as np
+import asyncio
+import collections
+import gzip
+import io
+import os
+import random
+import shutil
+import threading
 import time
 import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import NoCredentialsError, ClientError
 import pandas as pd
-import requests
 import psycopg2
+import psycopg2.pool
+import sys
+
+if not __package__:
+    # Rodando como script (python iot_sensor_simulation/iot_sensor_simulation.py, ou o
+    # arquivo copiado pelo deploy): o pacote iot_sensor_simulation fica na pasta de cima
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iot_sensor_simulation.edge_reduction import build_reducer
 
 # ---------------------- Sensores ----------------------
 class BaseSensor:
@@ -52,14 +71,505 @@ keys = [
     "windDirection"
 ]
 
+UNIT_MEASURE_MAP = {
+    "temperature": 1,
+    "airHumidity": 2,
+    "soilHumidity": 2,
+    "co2": 3,
+    "airQuality": 4,
+    "windSpeed": 5,
+    "windDirection": 6
+}
+
+# ---------------------- Frota vetorizada ----------------------
+def build_sensors_config(
+    n_temperature_sensors=1,
+    n_air_humidity_sensors=1,
+    n_soil_humidity_sensors=1,
+    n_co2_sensors=1,
+    n_air_quality_sensors=1,
+    n_wind_speed_sensors=1,
+    n_wind_direction_sensors=1
+):
+    return {
+        "temperature": (TemperatureSensor, n_temperature_sensors, 25.0, 5, 100),
+        "airHumidity": (AirHumiditySensor, n_air_humidity_sensors, 60.0, 0, 100),
+        "soilHumidity": (SoilHumiditySensor, n_soil_humidity_sensors, 40.0, 0, 100),
+        "co2": (Co2Sensor, n_co2_sensors, 400.0, 300, 6000),
+        "airQuality": (AirQualitySensor, n_air_quality_sensors, 8.0, 0, 150),
+        "windSpeed": (WindSpeedSensor, n_wind_speed_sensors, 5.0, 0, 50),
+        "windDirection": (WindDirectionSensor, n_wind_direction_sensors, 180.0, 0, 360),
+    }
+
+class SensorFleet:
+    """Estado de todos os sensores de uma fazenda em arrays NumPy.
+
+    Cada linha dos arrays é um sensor; as linhas de um mesmo tipo ficam
+    contíguas, na ordem de `sensors_config`. O passo de simulação é o mesmo
+    de `BaseSensor.simulate`, mas aplicado à frota inteira de uma vez.
+    """
+
+    def __init__(self, sensors_config, start_id=1, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.keys = []
+        self.slices = {}
+
+        initial, minimum, maximum, wrap = [], [], [], []
+        offset = 0
+        for key, (cls, n, init, minv, maxv) in sensors_config.items():
+            self.keys.append(key)
+            self.slices[key] = slice(offset, offset + n)
+            initial += [init] * n
+            minimum += [minv] * n
+            maximum += [maxv] * n
+            wrap += [issubclass(cls, WindDirectionSensor)] * n
+            offset += n
+
+        self.size = offset
+        self.current_values = np.array(initial, dtype=np.float64)
+        self.min_values = np.array(minimum, dtype=np.float64)
+        self.max_values = np.array(maximum, dtype=np.float64)
+        self.wrap_mask = np.array(wrap, dtype=bool)
+        self.sensor_ids = np.arange(start_id, start_id + offset, dtype=np.int64)
+        self.unit_ids = np.empty(offset, dtype=np.int16)
+        for key, sensor_slice in self.slices.items():
+            self.unit_ids[sensor_slice] = UNIT_MEASURE_MAP[key]
+        self._ids_by_key = {key: self.sensor_ids[s].tolist() for key, s in self.slices.items()}
+
+    def step(self, desc_mean, asc_mean, variation_level, n_steps=1):
+        # Um único sorteio para a frota inteira (e para todos os ticks pedidos):
+        # a média de cada incremento é -desc_mean ou asc_mean com a mesma chance.
+        shape = (n_steps, self.size)
+        means = np.where(self.rng.random(shape) < 0.5, -desc_mean, asc_mean)
+        increments = means + variation_level * self.rng.standard_normal(shape)
+
+        trajectory = np.round(self.current_values + np.cumsum(increments, axis=0), 2)
+        if n_steps:
+            self.current_values = trajectory[-1].copy()
+        return self.bound(trajectory)
+
+    def bound(self, values):
+        # Mesmo comportamento de BaseSensor._round_value: o estado interno não é
+        # limitado, apenas o valor emitido (clamp ou volta de 360° no vento).
+        clamped = np.clip(values, self.min_values, self.max_values)
+        return np.round(np.where(self.wrap_mask, np.mod(values, 360), clamped), 2)
+
+    def to_record(self, values, farm_id, insert_date):
+        # NaN marca leitura suprimida pelo deadband e fica fora do registro
+        values = values.tolist()
+        result = {"farmId": farm_id, "insertDate": insert_date}
+        for key in self.keys:
+            ids = self._ids_by_key[key]
+            result[key] = [
+                {"value": value, "sensorId": sensor_id}
+                for value, sensor_id in zip(values[self.slices[key]], ids)
+                if value == value
+            ]
+        return result
+
+    def to_summary_record(self, summary, farm_id):
+        # Registro de uma janela do WindowReducer: min/max/média por sensor
+        result = {
+            "farmId": farm_id,
+            "insertDate": str(summary["window_start"]),
+            "windowSeconds": summary["window_seconds"],
+            "count": summary["count"],
+        }
+        minimum, maximum, mean = summary["min"].tolist(), summary["max"].tolist(), summary["mean"].tolist()
+        for key in self.keys:
+            sensor_slice = self.slices[key]
+            result[key] = [
+                {"sensorId": sensor_id, "min": low, "max": high, "mean": avg}
+                for sensor_id, low, high, avg in zip(
+                    self._ids_by_key[key], minimum[sensor_slice], maximum[sensor_slice], mean[sensor_slice]
+                )
+            ]
+        return result
+
+# ---------------------- Métricas ----------------------
+class SimulationMetrics:
+    """Contadores, gauges e histogramas do simulador no formato texto do Prometheus.
+
+    `target_rate` é a taxa esperada em registros/s; se a taxa medida na
+    janela de `rate_window` segundos ficar abaixo de `behind_ratio` dela,
+    o gauge `iot_sim_behind_target` vai para 1.
+    """
+
+    LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    BATCH_BUCKETS = (1, 10, 50, 100, 200, 500, 1000, 5000, 10000)
+
+    HELP = {
+        "iot_sim_records_generated_total": ("counter", "Registros gerados pelo simulador."),
+        "iot_sim_records_dropped_total": ("counter", "Registros descartados por falha de envio, por sink."),
+        "iot_sim_records_per_second": ("gauge", "Taxa de geração medida na janela recente."),
+        "iot_sim_target_records_per_second": ("gauge", "Taxa de geração alvo."),
+        "iot_sim_behind_target": ("gauge", "1 quando a taxa medida está abaixo da alvo."),
+        "iot_sim_schedule_lag_seconds": ("gauge", "Atraso do agendador em relação ao deadline do próximo registro."),
+        "iot_sim_queue_depth": ("gauge", "Itens aguardando envio, por fila."),
+        "iot_sim_sink_latency_seconds": ("histogram", "Latência de envio por sink."),
+        "iot_sim_batch_size_records": ("histogram", "Tamanho dos batches enviados, por sink."),
+        "iot_sim_edge_reduction_ratio": ("gauge", "Valores brutos por valor emitido após a redução na borda."),
+        "iot_sim_edge_reduction_max_abs_error": ("gauge", "Maior erro absoluto introduzido pela redução na borda."),
+    }
+
+    def __init__(self, target_rate=0.0, rate_window=10.0, behind_ratio=0.95):
+        self.target_rate = target_rate
+        self.rate_window = rate_window
+        self.behind_ratio = behind_ratio
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+        self._recent = collections.deque()
+        self._started = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = (buckets, [0] * len(buckets), [0.0, 0])
+            bounds, counts, totals = self._histograms[key]
+            for i, bound in enumerate(bounds):
+                if value <= bound:
+                    counts[i] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def record_generated(self, n=1):
+        now = time.monotonic()
+        with self._lock:
+            self._counters[("iot_sim_records_generated_total", ())] += n
+            self._recent.append((now, n))
+            while self._recent and self._recent[0][0] < now - self.rate_window:
+                self._recent.popleft()
+
+    def records_per_second(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and self._recent[0][0] < now - self.rate_window:
+                self._recent.popleft()
+            window = min(self.rate_window, now - self._started)
+            total = sum(n for _, n in self._recent)
+        return total / window if window > 0 else 0.0
+
+    def is_behind_target(self):
+        if not self.target_rate or time.monotonic() - self._started < self.rate_window:
+            return False
+        return self.records_per_second() < self.target_rate * self.behind_ratio
+
+    def render(self):
+        rate = self.records_per_second()
+        self.set("iot_sim_records_per_second", rate)
+        self.set("iot_sim_target_records_per_second", self.target_rate)
+        self.set("iot_sim_behind_target", int(self.is_behind_target()))
+
+        samples = collections.defaultdict(list)
+        with self._lock:
+            for (name, labels), value in list(self._counters.items()) + list(self._gauges.items()):
+                samples[name].append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), (bounds, counts, (total, count)) in self._histograms.items():
+                for bound, bucket_count in zip(bounds, counts):
+                    samples[name].append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {bucket_count}")
+                samples[name].append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                samples[name].append(f"{name}_sum{_format_labels(labels)} {total}")
+                samples[name].append(f"{name}_count{_format_labels(labels)} {count}")
+
+        lines = []
+        for name in sorted(samples):
+            metric_type, help_text = self.HELP.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(samples[name])
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def start_metrics_server(metrics, port=9108, host="127.0.0.1"):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Métricas disponíveis em http://{host}:{port}/metrics")
+    return server
+
+# ---------------------- Batch colunar ----------------------
+class ColumnarBatch:
+    """Batch de leituras em arrays NumPy pré-alocados (um por coluna).
+
+    Guarda `capacity` ticks de uma fazenda: os valores ficam no formato longo
+    da tabela `fact` (uma linha por sensor e tick), enquanto sensorId e unidade
+    são preenchidos uma única vez na criação. A visão JSON aninhada só é
+    montada por `to_records`, quando um sink precisa dela.
+    """
+
+    __slots__ = (
+        "farm_id", "keys", "slices", "size", "capacity", "n_ticks",
+        "timestamps", "sensor_ids", "unit_ids", "values", "_ids_by_key"
+    )
+
+    def __init__(self, fleet, farm_id, capacity):
+        self.farm_id = farm_id
+        self.keys = fleet.keys
+        self.slices = fleet.slices
+        self.size = fleet.size
+        self.capacity = capacity
+        self.n_ticks = 0
+        self.timestamps = np.empty(capacity, dtype="datetime64[us]")
+        self.sensor_ids = np.tile(fleet.sensor_ids, capacity)
+        self.unit_ids = np.tile(fleet.unit_ids, capacity)
+        self.values = np.empty(capacity * fleet.size, dtype=np.float64)
+        self._ids_by_key = fleet._ids_by_key
+
+    def __len__(self):
+        return self.n_ticks
+
+    @property
+    def n_rows(self):
+        return self.n_ticks * self.size
+
+    def extend(self, timestamps, trajectory):
+        n = min(len(timestamps), self.capacity - self.n_ticks)
+        self.timestamps[self.n_ticks:self.n_ticks + n] = timestamps[:n]
+        self.values[self.n_rows:self.n_rows + n * self.size] = trajectory[:n].ravel()
+        self.n_ticks += n
+        return n
+
+    def clear(self):
+        self.n_ticks = 0
+
+    def snapshot(self):
+        # Cópia só com os ticks preenchidos, para sinks que rodam em outra thread
+        copy = object.__new__(ColumnarBatch)
+        copy.farm_id = self.farm_id
+        copy.keys = self.keys
+        copy.slices = self.slices
+        copy.size = self.size
+        copy.capacity = self.n_ticks
+        copy.n_ticks = self.n_ticks
+        copy.timestamps = self.timestamps[:self.n_ticks].copy()
+        copy.sensor_ids = self.sensor_ids[:self.n_rows]
+        copy.unit_ids = self.unit_ids[:self.n_rows]
+        copy.values = self.values[:self.n_rows].copy()
+        copy._ids_by_key = self._ids_by_key
+        return copy
+
+    def insert_dates(self):
+        return np.datetime_as_string(self.timestamps[:self.n_ticks], unit="us").tolist()
+
+    def tick_values(self):
+        return self.values[:self.n_rows].reshape(self.n_ticks, self.size)
+
+    def to_records(self):
+        # Valores NaN (suprimidos pelo deadband) ficam de fora; ticks sem nenhum valor também
+        records = []
+        for insert_date, values in zip(self.insert_dates(), self.tick_values().tolist()):
+            result = {"farmId": self.farm_id, "insertDate": insert_date}
+            emitted = False
+            for key in self.keys:
+                result[key] = [
+                    {"value": value, "sensorId": sensor_id}
+                    for value, sensor_id in zip(values[self.slices[key]], self._ids_by_key[key])
+                    if value == value
+                ]
+                emitted = emitted or bool(result[key])
+            if emitted:
+                records.append(result)
+        return records
+
+    def _long_rows(self):
+        n_rows = self.n_rows
+        timestamps = np.repeat(np.datetime_as_string(self.timestamps[:self.n_ticks], unit="us"), self.size)
+        columns = (self.sensor_ids[:n_rows], self.unit_ids[:n_rows], timestamps, self.values[:n_rows])
+        kept = ~np.isnan(self.values[:n_rows])
+        if not kept.all():
+            columns = tuple(column[kept] for column in columns)
+        return columns
+
+    def format_long(self, separation):
+        # Linhas (sensor_id, farm_id, unit_measure_id, timestamp, value), como na tabela `fact`
+        farm_id = self.farm_id
+        return "".join(
+            f"{sensor_id}{separation}{farm_id}{separation}{unit_id}{separation}{timestamp}{separation}{value}\n"
+            for sensor_id, unit_id, timestamp, value in zip(*(column.tolist() for column in self._long_rows()))
+        )
+
+    def format_wide(self, separation):
+        # Uma linha por tick, uma coluna por sensor; valor suprimido vira célula vazia
+        values = self.tick_values()
+        if np.isnan(values).any():
+            rows = ([("" if value != value else str(value)) for value in row] for row in values.tolist())
+        else:
+            rows = (list(map(str, row)) for row in values.tolist())
+        return "".join(
+            separation.join([insert_date] + row) + "\n"
+            for insert_date, row in zip(self.insert_dates(), rows)
+        )
+
+    def wide_header(self):
+        return ["insertDate"] + [
+            f"{key}_{sensor_id}" for key in self.keys for sensor_id in self._ids_by_key[key]
+        ]
+
+    def write_copy_rows(self, buffer):
+        text = self.format_long("\t")
+        buffer.write(text)
+        return text.count("\n")
+
+def _as_records(batch):
+    return batch.to_records() if isinstance(batch, ColumnarBatch) else batch
+
+# ---------------------- CSV ----------------------
+LONG_CSV_HEADER = ["sensorId", "farmId", "unitMeasureId", "insertDate", "value"]
+
+class CsvSink:
+    """Grava batches em CSV com todos os sensores, em layout longo ou largo.
+
+    Cada batch vira uma única escrita num arquivo com buffer de `buffer_size`
+    bytes. Com `max_bytes` e/ou `max_seconds` o arquivo é rotacionado
+    (`sensor_data_<data>_<n>.csv`); com `compress=True` sai em gzip.
+
+    `max_bytes` é o tamanho no disco: com `compress=True` conta os bytes já
+    comprimidos (a posição do arquivo .gz), não o texto escrito. O gzip
+    segura um pouco em buffer, então os arquivos passam um pouco do limite.
+    """
+
+    def __init__(
+        self,
+        file_name="sensor_data.csv",
+        layout="wide",
+        separation=";",
+        compress=False,
+        max_bytes=None,
+        max_seconds=None,
+        buffer_size=1024 * 1024
+    ):
+        if layout not in ("long", "wide"):
+            raise ValueError(f"Layout de CSV inválido: {layout}")
+        self.file_name = file_name
+        self.layout = layout
+        self.separation = separation
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer_size = buffer_size
+        self.files_written = []
+
+        self._file = None
+        self._raw = None
+        self._bytes = 0
+        self._opened_at = 0.0
+        self._index = 0
+
+    def write(self, batch):
+        if not len(batch):
+            return
+        if self.layout == "long":
+            header, text = LONG_CSV_HEADER, batch.format_long(self.separation)
+        else:
+            header, text = batch.wide_header(), batch.format_wide(self.separation)
+
+        if self._file is None or self._should_rotate():
+            self._open(header)
+        self._file.write(text)
+        self._bytes += len(text)
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def close(self):
+        if not self._file:
+            return
+        self._close_file()
+        if len(self.files_written) == 1:
+            print(f"Arquivo CSV salvo como '{self.files_written[0]}'")
+        else:
+            print(f"{len(self.files_written)} arquivos CSV salvos, de '{self.files_written[0]}' a '{self.files_written[-1]}'")
+
+    def _close_file(self):
+        self._file.close()
+        if self._raw:
+            self._raw.close()
+        self._file = None
+
+    def _size(self):
+        # Comprimido, o que importa é o .gz: a posição do arquivo bruto
+        return self._raw.tell() if self._raw else self._bytes
+
+    def _should_rotate(self):
+        if self.max_bytes and self._size() >= self.max_bytes:
+            return True
+        if self.max_seconds and time.monotonic() - self._opened_at >= self.max_seconds:
+            return True
+        return False
+
+    def _open(self, header):
+        if self._file:
+            self._close_file()
+        path = self._next_path()
+        if self.compress:
+            raw = open(path, "wb", buffering=self.buffer_size)
+            self._file = io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6), encoding="utf-8")
+            self._raw = raw
+        else:
+            self._file = open(path, "w", encoding="utf-8", buffering=self.buffer_size)
+            self._raw = None
+
+        text = self.separation.join(header) + "\n"
+        self._file.write(text)
+        self._bytes = len(text)
+        self._opened_at = time.monotonic()
+        self.files_written.append(path)
+
+    def _next_path(self):
+        root, extension = os.path.splitext(self.file_name)
+        if self.max_bytes or self.max_seconds:
+            self._index += 1
+            root = f"{root}_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{self._index:04d}"
+        return root + extension + (".gz" if self.compress else "")
+
 # ---------------------- Funções de envio ----------------------
+_s3_clients = {}
+
+def get_s3_client(profile_name="default", endpoint_url=None):
+    # Reaproveita o client (e o pool de conexões HTTP) entre os batches
+    key = (profile_name, endpoint_url)
+    if key not in _s3_clients:
+        session = boto3.Session(profile_name=profile_name) if profile_name else boto3.Session()
+        _s3_clients[key] = session.client('s3', endpoint_url=endpoint_url)
+    return _s3_clients[key]
+
 def upload_json_batch_to_s3(json_batch, bucket_name, s3_key):
-    s3 = boto3.Session(profile_name="default").client('s3')
+    s3 = get_s3_client()
     try:
         s3.put_object(
             Bucket=bucket_name,
             Key=s3_key,
-            Body=json.dumps(json_batch, indent=0)
+            Body=json.dumps(_as_records(json_batch), indent=0)
         )
         print(f"Batch JSON enviado para S3: s3://{bucket_name}/{s3_key}")
     except NoCredentialsError:
@@ -67,51 +577,463 @@ def upload_json_batch_to_s3(json_batch, bucket_name, s3_key):
     except ClientError as e:
         print(f"Erro ao enviar JSON: {e}")
 
-def upload_json_batch_to_postgres(json_batch, connection_params):
-    unit_measure_map = {
-        "temperature": 1,
-        "airHumidity": 2,
-        "soilHumidity": 2,
-        "co2": 3,
-        "airQuality": 4,
-        "windSpeed": 5,
-        "windDirection": 6
-    }
+class S3BatchUploader:
+    """Envia batches ao S3 numa thread de fundo, com um client reutilizado.
+
+    `payload_format` é "json" (lista JSON, como `upload_json_batch_to_s3`) ou
+    "ndjson"; `compression` pode ser None, "gzip" ou "zstd". Objetos acima de
+    `multipart_threshold` bytes vão por multipart upload. `submit` bloqueia
+    quando já há `max_in_flight` batches pendentes.
+    """
+
+    def __init__(
+        self,
+        bucket_name,
+        payload_format="json",
+        compression=None,
+        max_in_flight=2,
+        multipart_threshold=8 * 1024 * 1024,
+        profile_name="default",
+        endpoint_url=None,
+        metrics=None
+    ):
+        if payload_format not in ("json", "ndjson"):
+            raise ValueError(f"Formato de payload inválido: {payload_format}")
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Compressão inválida: {compression}")
+
+        self.bucket_name = bucket_name
+        self.payload_format = payload_format
+        self.compression = compression
+        self.metrics = metrics
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self.s3 = get_s3_client(profile_name, endpoint_url)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_threshold
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+
+    @property
+    def extension(self):
+        extension = ".json" if self.payload_format == "json" else ".ndjson"
+        if self.compression == "gzip":
+            extension += ".gz"
+        elif self.compression == "zstd":
+            extension += ".zst"
+        return extension
+
+    def submit(self, json_batch, s3_key):
+        self._slots.acquire()
+        with self._pending_lock:
+            self.pending += 1
+        # Copia o batch: o chamador o reutiliza logo depois do envio
+        if isinstance(json_batch, ColumnarBatch):
+            json_batch = json_batch.snapshot()
+        else:
+            json_batch = list(json_batch)
+        future = self._executor.submit(self._upload, json_batch, s3_key)
+        future.add_done_callback(self._release)
+        return future
 
+    def _release(self, future):
+        with self._pending_lock:
+            self.pending -= 1
+        self._slots.release()
+        # Rede de segurança: _upload já trata os erros, mas nada lê os futures
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Erro inesperado no envio ao S3: {future.exception()!r}")
+
+    def serialize(self, json_batch):
+        json_batch = _as_records(json_batch)
+        if self.payload_format == "json":
+            body = json.dumps(json_batch, separators=(",", ":")).encode("utf-8")
+            content_type = "application/json"
+        else:
+            body = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in json_batch).encode("utf-8")
+            content_type = "application/x-ndjson"
+
+        if self.compression == "gzip":
+            body = gzip.compress(body, compresslevel=6)
+        elif self.compression == "zstd":
+            import zstandard
+            body = zstandard.ZstdCompressor().compress(body)
+        return body, content_type
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _upload(self, json_batch, s3_key):
+        start = time.perf_counter()
+        try:
+            body, content_type = self.serialize(json_batch)
+            extra_args = {"ContentType": content_type}
+            if self.compression:
+                extra_args["ContentEncoding"] = self.compression
+            self.s3.upload_fileobj(
+                io.BytesIO(body),
+                self.bucket_name,
+                s3_key,
+                ExtraArgs=extra_args,
+                Config=self.transfer_config
+            )
+            print(f"Batch enviado para S3: s3://{self.bucket_name}/{s3_key} ({len(body)} bytes)")
+        except NoCredentialsError:
+            print("Credenciais AWS não encontradas.")
+            self._record_drop(json_batch)
+            return
+        except ClientError as e:
+            print(f"Erro ao enviar JSON: {e}")
+            self._record_drop(json_batch)
+            return
+        except Exception as e:
+            # EndpointConnectionError e outros BotoCoreError, erros de serialização...
+            print(f"Erro ao enviar batch para o S3: {e!r}")
+            self._record_drop(json_batch)
+            return
+
+        if self.metrics:
+            self.metrics.observe("iot_sim_sink_latency_seconds", time.perf_counter() - start, sink="s3")
+            self.metrics.observe("iot_sim_batch_size_records", len(json_batch), SimulationMetrics.BATCH_BUCKETS, sink="s3")
+
+    def _record_drop(self, json_batch):
+        if self.metrics:
+            self.metrics.inc("iot_sim_records_dropped_total", len(json_batch), sink="s3")
+
+def build_s3_key(json_batch, farm_id, s3_key_prefix, extension=".json"):
+    if isinstance(json_batch, ColumnarBatch):
+        insert_dates = json_batch.insert_dates()
+    else:
+        insert_dates = [json_data["insertDate"] for json_data in (json_batch[0], json_batch[-1])]
+    timestamp_start = insert_dates[0].replace(":", "-").replace(".", "-")
+    timestamp_end = insert_dates[-1].replace(":", "-").replace(".", "-")
+    return f"{s3_key_prefix}farm_{farm_id}_{timestamp_start}_to_{timestamp_end}{extension}"
+
+def flatten_json_batch(json_batch):
     records = []
     for json_data in json_batch:
         farm_id = json_data["farmId"]
         timestamp = json_data["insertDate"]
         for sensor_type, sensor_list in json_data.items():
-            if sensor_type not in unit_measure_map:
+            if sensor_type not in UNIT_MEASURE_MAP:
                 continue
-            unit_measure_id = unit_measure_map[sensor_type]
+            unit_measure_id = UNIT_MEASURE_MAP[sensor_type]
             for s in sensor_list:
                 sensor_id = s["sensorId"]
                 value = s["value"]
                 records.append((sensor_id, farm_id, unit_measure_id, timestamp, value))
+    return records
+
+class PostgresCopyLoader:
+    """Carrega registros na tabela `fact` via COPY FROM STDIN.
+
+    Mantém um pool de conexões aberto entre os batches em vez de conectar a
+    cada chamada; os registros são serializados num buffer em memória.
+    """
+
+    def __init__(self, connection_params, table="fact", minconn=1, maxconn=2):
+        self.table = table
+        self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **connection_params)
+
+    def load(self, records):
+        # `records` é um ColumnarBatch ou uma lista de tuplas no formato longo
+        start = time.perf_counter()
+        buffer = io.StringIO()
+        if isinstance(records, ColumnarBatch):
+            n_rows = records.write_copy_rows(buffer)
+        else:
+            n_rows = len(records)
+            buffer.writelines(
+                f"{sensor_id}\t{farm_id}\t{unit_measure_id}\t{timestamp}\t{value}\n"
+                for sensor_id, farm_id, unit_measure_id, timestamp, value in records
+            )
+        buffer.seek(0)
 
-    if not records:
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert(
+                    f"COPY {self.table} (sensor_id, farm_id, unit_measure_id, timestamp, value) FROM STDIN",
+                    buffer
+                )
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+        elapsed = time.perf_counter() - start
+        rows_per_second = n_rows / elapsed if elapsed > 0 else 0.0
+        print(f"{n_rows} registros inseridos no PostgreSQL em {elapsed * 1000:.1f} ms ({rows_per_second:.0f} linhas/s)")
+        return elapsed
+
+    def close(self):
+        self.pool.closeall()
+
+_postgres_loaders = {}
+
+def get_postgres_loader(connection_params):
+    # Um loader (e um pool) por processo e por conjunto de parâmetros
+    key = tuple(sorted(connection_params.items()))
+    if key not in _postgres_loaders:
+        _postgres_loaders[key] = PostgresCopyLoader(connection_params)
+    return _postgres_loaders[key]
+
+def upload_json_batch_to_postgres(json_batch, connection_params, metrics=None):
+    if isinstance(json_batch, ColumnarBatch):
+        records = json_batch
+    else:
+        records = flatten_json_batch(json_batch)
+    if not len(records):
         return
 
     try:
-        conn = psycopg2.connect(**connection_params)
-        cur = conn.cursor()
-        cur.executemany("""
-            INSERT INTO fact (sensor_id, farm_id, unit_measure_id, timestamp, value)
-            VALUES (%s, %s, %s, %s, %s)
-        """, records)
-        conn.commit()
-        print(f"{len(records)} registros inseridos no PostgreSQL")
+        elapsed = get_postgres_loader(connection_params).load(records)
     except Exception as e:
         print(f"Erro ao inserir batch no PostgreSQL: {e}")
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+        if metrics:
+            metrics.inc("iot_sim_records_dropped_total", len(json_batch), sink="postgres")
+        return
+
+    if metrics:
+        metrics.observe("iot_sim_sink_latency_seconds", elapsed, sink="postgres")
+        metrics.observe("iot_sim_batch_size_records", len(json_batch), SimulationMetrics.BATCH_BUCKETS, sink="postgres")
+
+def flush_batch(
+    batch,
+    metrics=None,
+    csv_sink=None,
+    postgres_connection_params=None,
+    s3_uploader=None,
+    s3_key_prefix="iot_sensor/"
+):
+    # Todos os sinks leem direto do ColumnarBatch; depois ele é reaproveitado
+    if csv_sink:
+        csv_start = time.perf_counter()
+        csv_sink.write(batch)
+        if metrics:
+            metrics.observe("iot_sim_sink_latency_seconds", time.perf_counter() - csv_start, sink="csv")
+
+    if postgres_connection_params:
+        upload_json_batch_to_postgres(batch, postgres_connection_params, metrics)
+
+    if s3_uploader:
+        s3_key = build_s3_key(batch, batch.farm_id, s3_key_prefix, s3_uploader.extension)
+        s3_uploader.submit(batch, s3_key)
+
+    batch.clear()
+
+# ---------------------- Envio assíncrono para API Gateway ----------------------
+class ApiGatewaySender:
+    """Envia registros ao API Gateway a partir de um event loop em segundo plano.
+
+    `submit` bloqueia o gerador enquanto a fila estiver cheia (backpressure).
+    Até `max_in_flight` POSTs ficam em voo sobre um pool de conexões
+    persistente; com `batch_size > 1` cada POST leva uma lista de registros.
+    """
+
+    def __init__(
+        self,
+        url,
+        max_in_flight=8,
+        batch_size=1,
+        queue_size=1000,
+        max_retries=3,
+        backoff_base=0.2,
+        backoff_max=5.0,
+        timeout=10,
+        metrics=None
+    ):
+        self.url = url
+        self.max_in_flight = max_in_flight
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.metrics = metrics
+
+        # Só este sink usa aiohttp; os outros modos rodam sem ele instalado.
+        # O import fica aqui, e não no event loop, para que a falta do pacote
+        # chegue ao chamador como ImportError em vez de travar o `_ready.wait()`.
+        import aiohttp
+        self._aiohttp = aiohttp
+
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._main(),), daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    def submit(self, record):
+        asyncio.run_coroutine_threadsafe(self._queue.put(record), self._loop).result()
+        self.enqueued += 1
+
+    def close(self):
+        # Espera a fila esvaziar antes de encerrar o event loop
+        self._loop.call_soon_threadsafe(self._closing.set)
+        self._thread.join()
+        self._loop.close()
+        print(f"API Gateway: {self.sent} enviados, {self.failed} com falha, {self.queued} na fila")
+
+    async def _main(self):
+        aiohttp = self._aiohttp
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._closing = asyncio.Event()
+
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            workers = [asyncio.create_task(self._worker(session)) for _ in range(self.max_in_flight)]
+            self._ready.set()
+
+            await self._closing.wait()
+            await self._queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self, session):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._post(session, batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _post(self, session, batch):
+        payload = batch if self.batch_size > 1 else batch[0]
+        error = None
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with session.post(self.url, json=payload) as response:
+                    await response.read()
+                    if response.status < 400:
+                        self.sent += len(batch)
+                        if self.metrics:
+                            self.metrics.observe("iot_sim_sink_latency_seconds", time.perf_counter() - start, sink="api_gateway")
+                            self.metrics.observe("iot_sim_batch_size_records", len(batch), SimulationMetrics.BATCH_BUCKETS, sink="api_gateway")
+                        return
+                    error = f"HTTP {response.status}"
+                    # Erros do cliente (exceto 429) não melhoram com nova tentativa
+                    if response.status < 500 and response.status != 429:
+                        break
+            except (self._aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt < self.max_retries:
+                # Backoff exponencial com jitter completo
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
+
+        self.failed += len(batch)
+        if self.metrics:
+            self.metrics.inc("iot_sim_records_dropped_total", len(batch), sink="api_gateway")
+        print(f"Erro ao enviar para API Gateway: {error}")
+
+# ---------------------- Controle de taxa ----------------------
+class RateScheduler:
+    """Mantém uma taxa alvo de registros/s por deadlines absolutos.
+
+    O deadline do próximo registro é `início + emitidos / rate`, então atrasos
+    de um sink não se acumulam como deriva. Depois de um travamento o
+    agendador recupera o atraso em rajada, mas no máximo `max_burst`
+    registros; o que passar disso é dado como perdido (`forgiven_seconds`).
+    """
+
+    def __init__(self, rate, max_burst=None):
+        if rate <= 0:
+            raise ValueError("A taxa alvo deve ser positiva")
+        self.rate = rate
+        self.max_burst = max_burst if max_burst is not None else max(1, rate)
+        self.issued = 0
+        self.forgiven_seconds = 0.0
+        self._start = None
+        self._deadline = None
+
+    def wait(self, n=1):
+        now = time.monotonic()
+        if self._start is None:
+            self._start = self._deadline = now
+
+        max_lag = self.max_burst / self.rate
+        if now - self._deadline > max_lag:
+            self.forgiven_seconds += now - self._deadline - max_lag
+            self._deadline = now - max_lag
+
+        if self._deadline > now:
+            time.sleep(self._deadline - now)
+        self._deadline += n / self.rate
+        self.issued += n
+
+    def lag(self):
+        if self._deadline is None:
+            return 0.0
+        return max(0.0, time.monotonic() - self._deadline)
+
+    def achieved_rate(self):
+        if self._start is None:
+            return 0.0
+        elapsed = time.monotonic() - self._start
+        return self.issued / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        print(
+            f"Taxa alvo: {self.rate:.2f} registros/s | atingida: {self.achieved_rate():.2f} registros/s | "
+            f"atraso atual: {self.lag():.3f}s | atraso descartado: {self.forgiven_seconds:.3f}s"
+        )
 
 # ---------------------- Simulação ----------------------
+def emit_to_sinks(fleet, batch, sender, farm_id, reducer, timestamps, trajectory):
+    """Passa os ticks gerados pela redução na borda (se houver) e entrega aos sinks.
+
+    Com deadband as leituras suprimidas viram NaN (os sinks as ignoram);
+    com janelas, só as janelas fechadas seguem, com a média como valor.
+    """
+    if reducer is not None and reducer.mode == "window":
+        emit_summaries(fleet, batch, sender, farm_id, reducer.reduce(timestamps, trajectory))
+        return
+    if reducer is not None:
+        mask = reducer.reduce(trajectory)
+        trajectory = np.where(mask, trajectory, np.nan)
+        emitted = mask.any(axis=1)
+        timestamps, trajectory = timestamps[emitted], trajectory[emitted]
+
+    batch.extend(timestamps, trajectory)
+    # Envio para API Gateway: único sink que precisa de um JSON por registro
+    if sender:
+        insert_dates = np.datetime_as_string(timestamps, unit="us").tolist()
+        for insert_date, values in zip(insert_dates, trajectory):
+            sender.submit(fleet.to_record(values, farm_id, insert_date))
+
+def emit_summaries(fleet, batch, sender, farm_id, summaries):
+    if not summaries:
+        return
+    batch.extend(
+        np.array([summary["window_start"] for summary in summaries], dtype="datetime64[us]"),
+        np.stack([summary["mean"] for summary in summaries])
+    )
+    if sender:
+        for summary in summaries:
+            sender.submit(fleet.to_summary_record(summary, farm_id))
+
 def begin_simulation(
     farm_id=4,
     n_temperature_sensors=1,
@@ -123,6 +1045,9 @@ def begin_simulation(
     n_wind_direction_sensors=1,
     send_to_api_gateway=False,
     api_gateway_url="",
+    api_gateway_max_in_flight=8,
+    api_gateway_batch_size=1,
+    api_gateway_queue_size=1000,
     interval=10,
     desc_mean=1,
     asc_mean=1,
@@ -131,109 +1056,378 @@ def begin_simulation(
     mass_generation=False,
     mass_generation_interval_seconds=3,
     jsons_per_second=10,
+    target_rate=None,
+    max_burst=None,
+    csv_file_name="sensor_data.csv",
     csv_separation=";",
+    csv_layout="wide",
+    csv_compress=False,
+    csv_max_bytes=None,
+    csv_max_seconds=None,
     upload_to_s3=False,
     s3_bucket_name="",
     s3_key_prefix="iot_sensor/",
+    s3_payload_format="json",
+    s3_compression=None,
+    s3_max_in_flight=2,
+    s3_endpoint_url=None,
     send_to_postgres=False,
     postgres_connection_params=None,
-    batch_size=50
+    batch_size=50,
+    metrics_port=None,
+    log_every=100,
+    edge_reduction=None,
+    deadband=0.5,
+    deadband_max_silence=None,
+    window_seconds=60
 ):
     try:
         # Configuração dinâmica dos sensores
-        sensors_config = {
-            "temperature": (TemperatureSensor, n_temperature_sensors, 25.0, 5, 100),
-            "airHumidity": (AirHumiditySensor, n_air_humidity_sensors, 60.0, 0, 100),
-            "soilHumidity": (SoilHumiditySensor, n_soil_humidity_sensors, 40.0, 0, 100),
-            "co2": (Co2Sensor, n_co2_sensors, 400.0, 300, 6000),
-            "airQuality": (AirQualitySensor, n_air_quality_sensors, 8.0, 0, 150),
-            "windSpeed": (WindSpeedSensor, n_wind_speed_sensors, 5.0, 0, 50),
-            "windDirection": (WindDirectionSensor, n_wind_direction_sensors, 180.0, 0, 360),
-        }
+        sensors_config = build_sensors_config(
+            n_temperature_sensors=n_temperature_sensors,
+            n_air_humidity_sensors=n_air_humidity_sensors,
+            n_soil_humidity_sensors=n_soil_humidity_sensors,
+            n_co2_sensors=n_co2_sensors,
+            n_air_quality_sensors=n_air_quality_sensors,
+            n_wind_speed_sensors=n_wind_speed_sensors,
+            n_wind_direction_sensors=n_wind_direction_sensors
+        )
+        fleet = SensorFleet(sensors_config)
+        # Redução na borda: None/"raw", "deadband" ou "window"
+        reducer = build_reducer(edge_reduction, deadband, deadband_max_silence, window_seconds, wrap=fleet.wrap_mask)
 
-        sensors = {}
-        sensor_id_counter = 1
-        for key, (cls, n, init, minv, maxv) in sensors_config.items():
-            sensors[key] = [{"sensor": cls(init, minv, maxv), "sensorId": sensor_id_counter + i} for i in range(n)]
-            sensor_id_counter += n
+        # Taxa alvo em registros/s; 0 desliga o controle de taxa
+        if target_rate is None:
+            target_rate = jsons_per_second if mass_generation else 1 / interval
+        scheduler = RateScheduler(target_rate, max_burst=max_burst) if target_rate else None
+        metrics = SimulationMetrics(target_rate=target_rate)
+        if metrics_port:
+            start_metrics_server(metrics, port=metrics_port)
+
+        s3_uploader = None
+        if upload_to_s3:
+            s3_uploader = S3BatchUploader(
+                s3_bucket_name,
+                payload_format=s3_payload_format,
+                compression=s3_compression,
+                max_in_flight=s3_max_in_flight,
+                endpoint_url=s3_endpoint_url,
+                metrics=metrics
+            )
+
+        sender = None
+        if send_to_api_gateway and api_gateway_url:
+            sender = ApiGatewaySender(
+                api_gateway_url,
+                max_in_flight=api_gateway_max_in_flight,
+                batch_size=api_gateway_batch_size,
+                queue_size=api_gateway_queue_size,
+                metrics=metrics
+            )
 
         # CSV
+        csv_sink = None
         if create_csv:
-            csv_file = open("sensor_data.csv", "w", encoding="utf-8")
-            header = ["insertDate"] + keys
-            csv_file.write(csv_separation.join(header) + "\n")
+            csv_sink = CsvSink(
+                csv_file_name,
+                layout=csv_layout,
+                separation=csv_separation,
+                compress=csv_compress,
+                max_bytes=csv_max_bytes,
+                max_seconds=csv_max_seconds
+            )
 
-        simulated_time = datetime.now()
-        json_batch = []
+        tick_seconds = mass_generation_interval_seconds if mass_generation else interval
+        tick_step = np.timedelta64(int(tick_seconds * 1_000_000), "us")
+        ticks = jsons_per_second if mass_generation else 1
+        batch = ColumnarBatch(fleet, farm_id, capacity=batch_size + ticks)
+        simulated_time = np.datetime64(datetime.now(), "us")
+        n_generated = 0
 
         while True:
-            start_time = time.time()
-
-            for _ in range(jsons_per_second if mass_generation else 1):
-                if mass_generation:
-                    simulated_time += pd.to_timedelta(mass_generation_interval_seconds, unit='s')
-                else:
-                    simulated_time += pd.to_timedelta(interval, unit='s')
-
-                result = {"farmId": farm_id, "insertDate": simulated_time.isoformat()}
-
-                for key in sensors.keys():
-                    sensor_list = []
-                    for s in sensors[key]:
-                        sensor_obj = s["sensor"]
-                        sensor_id = s["sensorId"]
-                        value = round(sensor_obj.simulate(np.random.choice([-desc_mean, asc_mean]), variation_level), 2)
-                        sensor_list.append({"value": value, "sensorId": sensor_id})
-                    result[key] = sensor_list
-
-                json_batch.append(result)
-
-                # Envio para API Gateway
-                if send_to_api_gateway and api_gateway_url:
-                    try:
-                        requests.post(url=api_gateway_url, json=result)
-                    except Exception as e:
-                        print(f"Erro ao enviar para API Gateway: {e}")
-
-                # CSV
-                if create_csv:
-                    row = [result["insertDate"]] + [result[k][0]["value"] for k in keys]
-                    csv_file.write(csv_separation.join(map(str, row)) + "\n")
-
-                print(json.dumps(result, indent=4))
-
-            # Batch para PostgreSQL
-            if send_to_postgres and postgres_connection_params and len(json_batch) >= batch_size:
-                upload_json_batch_to_postgres(json_batch, postgres_connection_params)
-
-            # Batch para S3
-            if upload_to_s3 and len(json_batch) >= batch_size:
-                timestamp_start = json_batch[0]["insertDate"].replace(":", "-").replace(".", "-")
-                timestamp_end = json_batch[-1]["insertDate"].replace(":", "-").replace(".", "-")
-                s3_key = f"{s3_key_prefix}farm_{farm_id}_{timestamp_start}_to_{timestamp_end}.json"
-                upload_json_batch_to_s3(json_batch, s3_bucket_name, s3_key)
-
-            if (upload_to_s3 or send_to_postgres) and len(json_batch) >= batch_size:
-                json_batch.clear()
-
-            # Sleep
-            sleep_time = interval if not mass_generation else 0
-            elapsed = time.time() - start_time
-            time.sleep(max(0, sleep_time - elapsed))
+            if scheduler:
+                scheduler.wait(ticks)
+                metrics.set("iot_sim_schedule_lag_seconds", scheduler.lag())
+
+            trajectory = fleet.step(desc_mean, asc_mean, variation_level, n_steps=ticks)
+            timestamps = simulated_time + tick_step * np.arange(1, ticks + 1)
+            simulated_time = timestamps[-1]
+            emit_to_sinks(fleet, batch, sender, farm_id, reducer, timestamps, trajectory)
+            if reducer:
+                reduction = reducer.stats()
+                metrics.set("iot_sim_edge_reduction_ratio", reduction["reduction_ratio"])
+                metrics.set("iot_sim_edge_reduction_max_abs_error", reduction["max_abs_error"])
+
+            # Log amostrado: um registro a cada `log_every`
+            if log_every:
+                for i in range(-(n_generated + 1) % log_every, ticks, log_every):
+                    print(json.dumps(fleet.to_record(trajectory[i], farm_id, str(timestamps[i])), indent=4))
+            n_generated += ticks
+
+            metrics.record_generated(ticks)
+            if sender:
+                metrics.set("iot_sim_queue_depth", sender.queued, queue="api_gateway")
+            if s3_uploader:
+                metrics.set("iot_sim_queue_depth", s3_uploader.pending, queue="s3")
+
+            if len(batch) >= batch_size:
+                flush_batch(
+                    batch,
+                    metrics,
+                    csv_sink=csv_sink,
+                    postgres_connection_params=postgres_connection_params if send_to_postgres else None,
+                    s3_uploader=s3_uploader,
+                    s3_key_prefix=s3_key_prefix
+                )
 
     except KeyboardInterrupt:
         print("\nSimulação interrompida pelo usuário.")
-        if create_csv:
+        if scheduler:
+            scheduler.report()
+        if reducer:
+            # Janela ainda aberta sai como está
+            if reducer.mode == "window":
+                emit_summaries(fleet, batch, sender, farm_id, reducer.flush())
+            reducer.report()
+        if sender:
+            sender.close()
+
+        if len(batch):
+            flush_batch(
+                batch,
+                metrics,
+                csv_sink=csv_sink,
+                postgres_connection_params=postgres_connection_params if send_to_postgres else None,
+                s3_uploader=s3_uploader,
+                s3_key_prefix=s3_key_prefix
+            )
+        if s3_uploader:
+            s3_uploader.close()
+        if csv_sink:
+            csv_sink.close()
+
+# ---------------------- Simulação multi-fazenda ----------------------
+SENSOR_COUNT_PARAMS = (
+    "n_temperature_sensors",
+    "n_air_humidity_sensors",
+    "n_soil_humidity_sensors",
+    "n_co2_sensors",
+    "n_air_quality_sensors",
+    "n_wind_speed_sensors",
+    "n_wind_direction_sensors"
+)
+
+def assign_sensor_id_ranges(farm_configs):
+    # Cada fazenda recebe uma faixa contígua de sensorId, sem sobreposição
+    start_ids = []
+    next_id = 1
+    for farm_config in farm_configs:
+        start_ids.append(next_id)
+        next_id += sum(farm_config.get(param, 1) for param in SENSOR_COUNT_PARAMS)
+    return start_ids
+
+def _simulate_farm_shard(
+    worker_index,
+    farms,
+    seed_sequence,
+    n_records_per_farm,
+    start_time,
+    interval_seconds,
+    desc_mean,
+    asc_mean,
+    variation_level,
+    batch_size,
+    csv_part_path,
+    csv_separation,
+    upload_to_s3,
+    s3_bucket_name,
+    s3_key_prefix,
+    send_to_postgres,
+    postgres_connection_params
+):
+    rng = np.random.default_rng(seed_sequence)
+    csv_file = open(csv_part_path, "w", encoding="utf-8") if csv_part_path else None
+    step = np.timedelta64(int(interval_seconds * 1_000_000), "us")
+    n_records = 0
+    worker_start = time.perf_counter()
+
+    try:
+        for farm_config, start_id in farms:
+            farm_id = farm_config["farm_id"]
+            sensor_counts = {param: farm_config.get(param, 1) for param in SENSOR_COUNT_PARAMS}
+            fleet = SensorFleet(build_sensors_config(**sensor_counts), start_id=start_id, rng=rng)
+            batch = ColumnarBatch(fleet, farm_id, capacity=batch_size)
+            simulated_time = np.datetime64(start_time, "us")
+
+            remaining = n_records_per_farm
+            while remaining > 0:
+                ticks = min(batch_size, remaining)
+                trajectory = fleet.step(desc_mean, asc_mean, variation_level, n_steps=ticks)
+                timestamps = simulated_time + step * np.arange(1, ticks + 1)
+                simulated_time = timestamps[-1]
+                batch.extend(timestamps, trajectory)
+
+                if csv_file:
+                    csv_file.write(batch.format_long(csv_separation))
+                if send_to_postgres and postgres_connection_params:
+                    upload_json_batch_to_postgres(batch, postgres_connection_params)
+                if upload_to_s3:
+                    s3_key = build_s3_key(batch, farm_id, s3_key_prefix)
+                    upload_json_batch_to_s3(batch, s3_bucket_name, s3_key)
+                batch.clear()
+
+                n_records += ticks
+                remaining -= ticks
+    finally:
+        if csv_file:
             csv_file.close()
-            print("Arquivo CSV salvo como 'sensor_data.csv'")
-
-        if send_to_postgres and json_batch and postgres_connection_params:
-            upload_json_batch_to_postgres(json_batch, postgres_connection_params)
-        if upload_to_s3 and json_batch:
-            timestamp_start = json_batch[0]["insertDate"].replace(":", "-").replace(".", "-")
-            timestamp_end = json_batch[-1]["insertDate"].replace(":", "-").replace(".", "-")
-            s3_key = f"{s3_key_prefix}farm_{farm_id}_{timestamp_start}_to_{timestamp_end}.json"
-            upload_json_batch_to_s3(json_batch, s3_bucket_name, s3_key)
+
+    return worker_index, n_records, time.perf_counter() - worker_start
+
+def begin_multi_farm_simulation(
+    farm_configs,
+    n_records_per_farm=1000,
+    root_seed=None,
+    n_workers=None,
+    start_time=None,
+    interval_seconds=10,
+    desc_mean=1,
+    asc_mean=1,
+    variation_level=0.3,
+    batch_size=200,
+    create_csv=False,
+    csv_file_name="sensor_data.csv",
+    csv_separation=";",
+    upload_to_s3=False,
+    s3_bucket_name="",
+    s3_key_prefix="iot_sensor/",
+    send_to_postgres=False,
+    postgres_connection_params=None
+):
+    """Simula várias fazendas em paralelo, distribuídas num pool de processos.
+
+    `farm_configs` é uma lista de dicts com `farm_id` e, opcionalmente, os
+    mesmos `n_*_sensors` de `begin_simulation` (padrão 1 de cada). Cada
+    worker recebe um `np.random.Generator` próprio derivado de `root_seed`.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(farm_configs)))
+    if start_time is None:
+        start_time = datetime.now()
+
+    farms = list(zip(farm_configs, assign_sensor_id_ranges(farm_configs)))
+    shards = [farms[i::n_workers] for i in range(n_workers)]
+    seeds = np.random.SeedSequence(root_seed).spawn(n_workers)
+    csv_parts = [f"{csv_file_name}.part{i}" if create_csv else None for i in range(n_workers)]
+
+    total_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(
+                _simulate_farm_shard,
+                i, shards[i], seeds[i], n_records_per_farm, start_time, interval_seconds,
+                desc_mean, asc_mean, variation_level, batch_size,
+                csv_parts[i], csv_separation,
+                upload_to_s3, s3_bucket_name, s3_key_prefix,
+                send_to_postgres, postgres_connection_params
+            )
+            for i in range(n_workers)
+        ]
+        results = sorted(future.result() for future in futures)
+    total_elapsed = time.perf_counter() - total_start
+
+    # Junta as partes de cada worker em um único CSV
+    if create_csv:
+        with open(csv_file_name, "w", encoding="utf-8") as csv_file:
+            csv_file.write(csv_separation.join(LONG_CSV_HEADER) + "\n")
+            for part in csv_parts:
+                with open(part, "r", encoding="utf-8") as part_file:
+                    shutil.copyfileobj(part_file, csv_file)
+                os.remove(part)
+        print(f"Arquivo CSV salvo como '{csv_file_name}'")
+
+    stats = []
+    for worker_index, n_records, elapsed in results:
+        rate = n_records / elapsed if elapsed > 0 else 0.0
+        stats.append({"worker": worker_index, "records": n_records, "seconds": elapsed, "records_per_second": rate})
+        print(f"Worker {worker_index}: {n_records} registros em {elapsed:.2f}s ({rate:.0f} registros/s)")
+
+    total_records = sum(s["records"] for s in stats)
+    total_rate = total_records / total_elapsed if total_elapsed > 0 else 0.0
+    print(f"Total: {total_records} registros de {len(farm_configs)} fazendas em {total_elapsed:.2f}s "
+          f"({total_rate:.0f} registros/s, {n_workers} workers)")
+
+    return stats
+
+# ---------------------- Backfill histórico ----------------------
+def backfill_to_parquet(
+    start_date,
+    end_date,
+    output_dir,
+    farm_config=None,
+    interval_seconds=10,
+    chunk_ticks=None,
+    desc_mean=1,
+    asc_mean=1,
+    variation_level=0.3,
+    seed=None,
+    start_id=1
+):
+    """Gera o histórico de uma fazenda entre `start_date` e `end_date` em Parquet.
+
+    Os dados saem no formato longo da tabela `fact`, particionados em
+    `farm_id=<id>/date=<AAAA-MM-DD>`. A geração é feita em blocos de
+    `chunk_ticks` leituras (padrão: um dia), então a memória usada depende
+    só do tamanho do bloco e não do intervalo pedido.
+    """
+    # Só o backfill precisa do pyarrow; o simulador ao vivo roda sem ele
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if farm_config is None:
+        farm_config = {"farm_id": 4}
+    farm_id = farm_config["farm_id"]
+    sensor_counts = {param: farm_config.get(param, 1) for param in SENSOR_COUNT_PARAMS}
+    fleet = SensorFleet(build_sensors_config(**sensor_counts), start_id=start_id, rng=np.random.default_rng(seed))
+
+    step_ms = int(interval_seconds * 1000)
+    start_ms = pd.Timestamp(start_date).value // 1_000_000
+    end_ms = pd.Timestamp(end_date).value // 1_000_000
+    total_ticks = max(0, -(-(end_ms - start_ms) // step_ms))
+    if chunk_ticks is None:
+        chunk_ticks = max(1, 86_400_000 // step_ms)
+
+    n_rows = 0
+    backfill_start = time.perf_counter()
+    for chunk_index, first_tick in enumerate(range(0, total_ticks, chunk_ticks)):
+        ticks = min(chunk_ticks, total_ticks - first_tick)
+        values = fleet.step(desc_mean, asc_mean, variation_level, n_steps=ticks)
+
+        timestamps = start_ms + (first_tick + np.arange(ticks, dtype=np.int64)) * step_ms
+        timestamps = np.repeat(timestamps, fleet.size)
+
+        table = pa.table({
+            "farm_id": np.full(timestamps.size, farm_id, dtype=np.int32),
+            "date": pa.array((timestamps // 86_400_000).astype(np.int32), type=pa.date32()),
+            "sensor_id": np.tile(fleet.sensor_ids, ticks),
+            "unit_measure_id": np.tile(fleet.unit_ids, ticks),
+            "timestamp": pa.array(timestamps, type=pa.timestamp("ms")),
+            "value": values.ravel(),
+        })
+        pq.write_to_dataset(
+            table,
+            root_path=output_dir,
+            partition_cols=["farm_id", "date"],
+            basename_template=f"part-{chunk_index:06d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore"
+        )
+        n_rows += table.num_rows
+
+    elapsed = time.perf_counter() - backfill_start
+    rows_per_second = n_rows / elapsed if elapsed > 0 else 0.0
+    print(f"Backfill da fazenda {farm_id}: {n_rows} linhas em {elapsed:.2f}s ({rows_per_second:.0f} linhas/s) em '{output_dir}'")
+    return n_rows
 
 # ---------------------- Execução ----------------------
 if __name__ == "__main__":
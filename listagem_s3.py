@@ -0,0 +1,118 @@
+import collections
+import sqlite3
+import time
+
+class ListagemIncremental:
+    """Listagem incremental de um bucket S3 com checkpoint salvo em disco.
+
+    Cada ciclo lista só as chaves depois do checkpoint (`StartAfter`),
+    paginando até o fim, então custa O(objetos novos) e não O(bucket). As
+    chaves processadas ficam num SQLite (`caminho_estado`), que sobrevive a
+    reinícios. O checkpoint só avança sobre chaves já processadas: se uma
+    falhar, ela volta na próxima listagem.
+
+    O S3 lista em ordem lexicográfica; uma chave que chegue "antes" do
+    checkpoint só é vista por `varredura_completa`, que percorre o prefixo
+    inteiro e deve rodar de vez em quando como reconciliação.
+    """
+
+    def __init__(self, s3, bucket, prefixo="", caminho_estado="estado_s3.sqlite3"):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefixo = prefixo
+        self.conexao = sqlite3.connect(caminho_estado)
+        self.conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoint (
+                bucket TEXT NOT NULL,
+                prefixo TEXT NOT NULL,
+                start_after TEXT NOT NULL,
+                PRIMARY KEY (bucket, prefixo)
+            );
+            CREATE TABLE IF NOT EXISTS processados (
+                bucket TEXT NOT NULL,
+                chave TEXT NOT NULL,
+                PRIMARY KEY (bucket, chave)
+            ) WITHOUT ROWID;
+        """)
+        self.conexao.commit()
+        self._pendentes = collections.deque()
+        self._concluidos = set()
+
+    @property
+    def checkpoint(self):
+        linha = self.conexao.execute(
+            "SELECT start_after FROM checkpoint WHERE bucket = ? AND prefixo = ?", (self.bucket, self.prefixo)
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def _salvar_checkpoint(self, chave):
+        self.conexao.execute(
+            "INSERT OR REPLACE INTO checkpoint (bucket, prefixo, start_after) VALUES (?, ?, ?)",
+            (self.bucket, self.prefixo, chave)
+        )
+
+    def _listar(self, start_after=None):
+        parametros = {"Bucket": self.bucket, "Prefix": self.prefixo}
+        if start_after:
+            parametros["StartAfter"] = start_after
+        for pagina in self.s3.get_paginator("list_objects_v2").paginate(**parametros):
+            for obj in pagina.get("Contents", []):
+                yield obj["Key"]
+
+    def _nao_processadas(self, chaves):
+        # deque: marcar_processado tira do começo a cada chave concluída
+        return collections.deque(chave for chave in chaves if not self.ja_processado(chave))
+
+    def novos(self):
+        """Chaves ainda não processadas depois do checkpoint, em ordem."""
+        chaves = list(self._listar(self.checkpoint))
+        self._pendentes = self._nao_processadas(chaves)
+        self._concluidos = set()
+        return list(self._pendentes)
+
+    def varredura_completa(self):
+        """Lista o prefixo inteiro e devolve tudo o que nunca foi processado.
+
+        Também remove do estado as chaves que não existem mais no bucket
+        (apagadas por lifecycle, por exemplo), para o SQLite não crescer à toa.
+        """
+        inicio = time.perf_counter()
+        chaves = list(self._listar())
+        existentes = set(chaves)
+        removidas = [
+            (self.bucket, chave)
+            for chave, in self.conexao.execute("SELECT chave FROM processados WHERE bucket = ?", (self.bucket,))
+            if chave.startswith(self.prefixo) and chave not in existentes
+        ]
+        self.conexao.executemany("DELETE FROM processados WHERE bucket = ? AND chave = ?", removidas)
+        self.conexao.commit()
+
+        self._pendentes = self._nao_processadas(chaves)
+        self._concluidos = set()
+        print(f"🔎 Varredura completa: {len(chaves)} objetos, {len(self._pendentes)} não processados, "
+              f"{len(removidas)} removidos do estado ({time.perf_counter() - inicio:.1f}s)")
+        return list(self._pendentes)
+
+    def ja_processado(self, chave):
+        return self.conexao.execute(
+            "SELECT 1 FROM processados WHERE bucket = ? AND chave = ?", (self.bucket, chave)
+        ).fetchone() is not None
+
+    def marcar_processado(self, chave):
+        """Registra `chave` e avança o checkpoint até a primeira chave pendente."""
+        self.conexao.execute(
+            "INSERT OR IGNORE INTO processados (bucket, chave) VALUES (?, ?)", (self.bucket, chave)
+        )
+        self._concluidos.add(chave)
+
+        checkpoint = self.checkpoint
+        while self._pendentes and self._pendentes[0] in self._concluidos:
+            chave_concluida = self._pendentes.popleft()
+            self._concluidos.discard(chave_concluida)
+            if checkpoint is None or chave_concluida > checkpoint:
+                checkpoint = chave_concluida
+                self._salvar_checkpoint(checkpoint)
+        self.conexao.commit()
+
+    def fechar(self):
+        self.conexao.close()
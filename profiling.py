@@ -0,0 +1,149 @@
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import psutil
+
+PASTA_PERFIS = "perfis"
+
+def medir_memoria():
+    """RSS do processo em MB."""
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+class PerfilEtapas:
+    """Perfil por etapa: tempo de parede, CPU, variação de RSS e pico do tracemalloc.
+
+    Uso como context manager ou decorator:
+
+        perfil = PerfilEtapas(top_n=10)
+        with perfil.etapa("geracao", qtd_dados=500000):
+            dados = gerar_dados(500000)
+
+        @perfil.medir("serializacao")
+        def data_to_json(data): ...
+
+    Etapas podem ser aninhadas; o pico da etapa externa inclui o das internas.
+    Com `top_n` > 0, cada etapa guarda as `top_n` linhas que mais alocaram
+    entre o início e o fim (diferença de snapshots do tracemalloc), o que
+    aponta a linha exata que segura a memória.
+    """
+
+    def __init__(self, top_n=0, nframes=1):
+        self.top_n = top_n
+        self.nframes = nframes
+        self.resultados = []
+        self._pilha = []
+        self._iniciou_tracemalloc = False
+
+    @contextlib.contextmanager
+    def etapa(self, nome, **contexto):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(self.nframes, 1))
+            self._iniciou_tracemalloc = True
+
+        atual, pico = tracemalloc.get_traced_memory()
+        if self._pilha:
+            # O reset_peak abaixo apagaria o pico da etapa externa
+            self._pilha[-1]["pico"] = max(self._pilha[-1]["pico"], pico)
+        tracemalloc.reset_peak()
+
+        quadro = {"pico": atual}
+        self._pilha.append(quadro)
+        snapshot_inicio = tracemalloc.take_snapshot() if self.top_n else None
+        rss_inicio = medir_memoria()
+        cpu_inicio = time.process_time()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            tempo = time.perf_counter() - inicio
+            cpu = time.process_time() - cpu_inicio
+            rss_fim = medir_memoria()
+            pico = max(quadro["pico"], tracemalloc.get_traced_memory()[1])
+            alocacoes = self._maiores_alocacoes(snapshot_inicio) if self.top_n else []
+
+            self._pilha.pop()
+            if self._pilha:
+                self._pilha[-1]["pico"] = max(self._pilha[-1]["pico"], pico)
+            elif self._iniciou_tracemalloc:
+                tracemalloc.stop()
+                self._iniciou_tracemalloc = False
+
+            resultado = {
+                "etapa": nome,
+                **contexto,
+                "nivel": len(self._pilha),
+                "tempo_s": tempo,
+                "cpu_s": cpu,
+                "rss_inicio_mb": rss_inicio,
+                "rss_fim_mb": rss_fim,
+                "rss_delta_mb": rss_fim - rss_inicio,
+                "pico_mb": (pico - atual) / (1024 * 1024),
+                "alocacoes": alocacoes,
+            }
+            self.resultados.append(resultado)
+            print(f"🔬 {nome} | {tempo:.3f}s (CPU {cpu:.3f}s) | RSS {resultado['rss_delta_mb']:+.1f} MB | Pico {resultado['pico_mb']:.1f} MB")
+
+    def medir(self, nome=None, **contexto):
+        """Decorator: cada chamada da função vira uma etapa."""
+        def decorator(funcao):
+            @functools.wraps(funcao)
+            def envoltorio(*args, **kwargs):
+                with self.etapa(nome or funcao.__name__, **contexto):
+                    return funcao(*args, **kwargs)
+            return envoltorio
+        return decorator
+
+    def _maiores_alocacoes(self, snapshot_inicio):
+        filtros = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, os.path.join(os.path.dirname(psutil.__file__), "*")),
+        ]
+        fim = tracemalloc.take_snapshot().filter_traces(filtros)
+        diferencas = fim.compare_to(snapshot_inicio.filter_traces(filtros), "lineno")
+        return [
+            {
+                "arquivo": diferenca.traceback[0].filename,
+                "linha": diferenca.traceback[0].lineno,
+                "delta_kb": diferenca.size_diff / 1024,
+                "total_kb": diferenca.size / 1024,
+                "blocos": diferenca.count_diff,
+            }
+            for diferenca in diferencas[:self.top_n]
+        ]
+
+    def salvar(self, caminho):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(self.resultados, f, indent=2, ensure_ascii=False)
+        return caminho
+
+def carregar(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+def tabela(resultados, etapa, *campos):
+    """Linhas (qtd_dados, campo1, campo2, ...) de uma etapa, no formato dos `gerar_graficos`."""
+    return [
+        (r["qtd_dados"], *(r[campo] for campo in campos))
+        for r in resultados if r["etapa"] == etapa and "qtd_dados" in r
+    ]
+
+def imprimir_alocacoes(resultados):
+    for r in resultados:
+        if not r.get("alocacoes"):
+            continue
+        print(f"\n{r['etapa']} ({r.get('qtd_dados', '-')} dados) | Pico {r['pico_mb']:.1f} MB")
+        for alocacao in r["alocacoes"]:
+            print(f"  {alocacao['delta_kb']:>+12.1f} KB  {alocacao['blocos']:>+9} blocos  {alocacao['arquivo']}:{alocacao['linha']}")
+
+if __name__ == "__main__":
+    for caminho in sys.argv[1:]:
+        imprimir_alocacoes(carregar(caminho))
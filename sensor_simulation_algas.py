@@ -1,19 +1,23 @@
 import random
+import numpy as np
 import time
-import tracemalloc
-import psutil
 import mysql.connector
 import threading
 import queue
-import concurrent.futures
+import os
+import sys
+import tempfile
 import matplotlib.pyplot as plt
+import benchmark
+import profiling
 
-def conectar_bd():
+def conectar_bd(**opcoes):
     return mysql.connector.connect(
         host="127.0.0.1",
         user="Aluno",
         password="urubu100",
-        database="eco_fire_watch"
+        database="eco_fire_watch",
+        **opcoes
     )
 
 def criar_tabela():
@@ -37,15 +41,31 @@ def criar_tabela():
 criar_tabela()
 
 class Sensor:
+    __slots__ = ("nome", "valor")
+
     def __init__(self, nome, valor_inicial):
         self.nome = nome
         self.valor = valor_inicial
     
-    def medir(self):
+    def medir(self, rng=random):
         """Gera medições aleatórias dentro da faixa esperada."""
-        self.valor = round(self.valor + random.uniform(-0.5, 0.5), 2)
+        self.valor = round(self.valor + rng.uniform(-0.5, 0.5), 2)
         return self.valor
 
+    def medir_lote(self, n, rng=np.random):
+        """Gera n medições de uma vez, com a mesma série de n chamadas a `medir`.
+
+        Como `medir` arredonda o valor a cada passo, cada incremento é
+        arredondado antes da soma acumulada (o valor inicial entra no primeiro).
+        """
+        passos = rng.uniform(-0.5, 0.5, n)
+        if not n:
+            return passos
+        passos[0] += self.valor
+        valores = np.round(np.cumsum(np.round(passos, 2)), 2)
+        self.valor = float(valores[-1])
+        return valores
+
 sensors = [
     Sensor("temperatura", 25.0),
     Sensor("umidade_ar", 60.0),
@@ -55,49 +75,142 @@ sensors = [
     Sensor("qualidade_ar", 8.0)
 ]
 
-def medir_memoria():
-    return psutil.Process().memory_info().rss / (1024 * 1024)
+COLUNAS_SENSORES = "temperatura, umidade_ar, umidade_solo, vento_velocidade, co_ar, qualidade_ar"
 
-def medir_memoria_maxima():
-    return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+def gerar_bloco(qtd):
+    """Gera `qtd` leituras como um array (qtd, len(sensors))."""
+    return np.column_stack([sensor.medir_lote(qtd) for sensor in sensors])
 
-def gerar_dados(qtd_dados):
-    """Gera dados usando threads para melhorar a performance"""
-    def worker(q, qtd):
-        """Thread worker para gerar medições"""
-        for _ in range(qtd):
-            leitura = tuple(sensor.medir() for sensor in sensors)
-            q.put(leitura)
-    
-    q = queue.Queue()
-    num_threads = min(1, qtd_dados // 100 + 1)
-    threads = []
+def gerar_dados_em_blocos(qtd_dados, tamanho_bloco=100000):
+    """Gera `qtd_dados` leituras em blocos NumPy de até `tamanho_bloco` linhas.
 
-    for _ in range(num_threads):
-        t = threading.Thread(target=worker, args=(q, qtd_dados // num_threads))
-        t.start()
-        threads.append(t)
+    Só um bloco existe por vez, então a memória de pico depende do tamanho
+    do bloco e não de `qtd_dados`.
+    """
+    for inicio in range(0, qtd_dados, tamanho_bloco):
+        yield gerar_bloco(min(tamanho_bloco, qtd_dados - inicio))
 
-    for t in threads:
-        t.join()
+def gerar_dados(qtd_dados):
+    """Gera todas as leituras numa lista de tuplas (use `gerar_dados_em_blocos` para volumes grandes)."""
+    return [leitura for bloco in gerar_dados_em_blocos(qtd_dados) for leitura in map(tuple, bloco.tolist())]
 
-    return [q.get() for _ in range(q.qsize())]
+def salvar_no_banco(dados, batch_size=500000, linhas_por_lote=10000):
+    """Salva os dados no banco em lotes otimizados.
 
-def salvar_no_banco(dados):
-    """Salva os dados no banco em lotes otimizados"""
+    `dados` pode ser uma lista de leituras ou um iterável de blocos, como o
+    de `gerar_dados_em_blocos`. Blocos são convertidos para tuplas em fatias
+    de `linhas_por_lote`, com um commit por bloco.
+    """
     conn = conectar_bd()
     cursor = conn.cursor()
-    
-    batch_size = 500000
-    for i in range(0, len(dados), batch_size):
-        cursor.executemany("""
-            INSERT INTO sensores (temperatura, umidade_ar, umidade_solo, vento_velocidade, co_ar, qualidade_ar)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, dados[i:i + batch_size])
-        conn.commit()
+    sql = f"INSERT INTO sensores ({COLUNAS_SENSORES}) VALUES (%s, %s, %s, %s, %s, %s)"
+
+    if isinstance(dados, list):
+        for i in range(0, len(dados), batch_size):
+            cursor.executemany(sql, dados[i:i + batch_size])
+            conn.commit()
+    else:
+        for bloco in dados:
+            for i in range(0, len(bloco), linhas_por_lote):
+                cursor.executemany(sql, bloco[i:i + linhas_por_lote].tolist())
+            conn.commit()
 
     conn.close()
 
+def carregar_bloco_load_data(cursor, bloco):
+    """Carrega um bloco via LOAD DATA LOCAL INFILE.
+
+    O mysql.connector só lê LOCAL INFILE de um caminho, então o bloco vai
+    para um arquivo temporário em /dev/shm (memória) quando disponível.
+    """
+    pasta = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", dir=pasta, delete=False) as arquivo:
+        np.savetxt(arquivo, bloco, fmt="%.2f", delimiter="\t")
+        caminho = arquivo.name
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE '{caminho}' INTO TABLE sensores
+            FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'
+            ({COLUNAS_SENSORES})
+        """)
+    finally:
+        os.remove(caminho)
+
+def carregar_bloco_insert(cursor, bloco, linhas_por_insert=10000):
+    """Carrega um bloco com INSERTs de várias linhas."""
+    for inicio in range(0, len(bloco), linhas_por_insert):
+        valores = ",".join(
+            "(" + ",".join(f"{valor:.2f}" for valor in linha) + ")"
+            for linha in bloco[inicio:inicio + linhas_por_insert].tolist()
+        )
+        cursor.execute(f"INSERT INTO sensores ({COLUNAS_SENSORES}) VALUES {valores}")
+
+def salvar_em_pipeline(qtd_dados, tamanho_bloco=100000, blocos_em_espera=2, usar_load_data=True):
+    """Gera e salva em paralelo: o bloco k é carregado enquanto o k+1 é gerado.
+
+    A fila entre gerador e carregador guarda no máximo `blocos_em_espera`
+    blocos, então a memória não depende de `qtd_dados`. Usa LOAD DATA LOCAL
+    INFILE e cai para INSERTs de várias linhas se o servidor não permitir.
+    Retorna os tempos de geração, de carga e o total.
+    """
+    fila = queue.Queue(maxsize=blocos_em_espera)
+    tempos = {"geracao": 0.0, "carga": 0.0, "total": 0.0}
+    erros = []
+
+    # Conecta antes de iniciar o carregador: se falhar, o erro sobe aqui e o
+    # gerador nunca fica esperando uma fila que ninguém esvazia
+    conn = conectar_bd(allow_local_infile=usar_load_data)
+    cursor = conn.cursor()
+
+    def carregador():
+        load_data = usar_load_data
+        try:
+            while True:
+                bloco = fila.get()
+                if bloco is None:
+                    break
+                inicio = time.perf_counter()
+                if load_data:
+                    try:
+                        carregar_bloco_load_data(cursor, bloco)
+                    except mysql.connector.Error as e:
+                        print(f"⚠️  LOAD DATA indisponível ({e}); usando INSERT de várias linhas.")
+                        load_data = False
+                if not load_data:
+                    carregar_bloco_insert(cursor, bloco)
+                conn.commit()
+                tempos["carga"] += time.perf_counter() - inicio
+        except Exception as e:
+            erros.append(e)
+            # Esvazia a fila para o gerador não ficar bloqueado
+            while fila.get() is not None:
+                pass
+        finally:
+            cursor.close()
+            conn.close()
+
+    inicio_total = time.perf_counter()
+    thread = threading.Thread(target=carregador)
+    thread.start()
+    try:
+        blocos = gerar_dados_em_blocos(qtd_dados, tamanho_bloco)
+        while True:
+            inicio_geracao = time.perf_counter()
+            bloco = next(blocos, None)
+            tempos["geracao"] += time.perf_counter() - inicio_geracao
+            if bloco is None:
+                break
+            fila.put(bloco)
+    finally:
+        fila.put(None)
+        thread.join()
+    tempos["total"] = time.perf_counter() - inicio_total
+
+    if erros:
+        raise erros[0]
+    print(f"🚀 Pipeline {qtd_dados} dados | Geração: {tempos['geracao']:.2f}s | Carga: {tempos['carga']:.2f}s | Total: {tempos['total']:.2f}s")
+    return tempos
+
 def gerar_graficos(desempenho):
     """Gera gráficos do desempenho da geração e salvamento de dados."""
     qtd_dados, tempos_geracao, tempos_salvamento, mem_usada, mem_max = zip(*desempenho)
@@ -132,31 +245,59 @@ def gerar_graficos(desempenho):
     plt.tight_layout()
     plt.show()
 
-def iniciar_teste():
-    tracemalloc.start()
-    ranges = [10, 100, 1000, 10000, 100000, 1000000, 1000000, 3000000]
-    desempenho = []
-    
+def consumir_blocos(qtd_dados):
+    for _ in gerar_dados_em_blocos(qtd_dados):
+        pass
+
+def iniciar_teste(aquecimento=1, repeticoes=3):
+    ranges = [10, 100, 1000, 10000, 100000, 1000000, 3000000]
+    # Geração e salvamento consomem o mesmo fluxo de blocos, então o pico de
+    # memória medido pelo tracemalloc não cresce com `qtd_dados`
+    relatorio = benchmark.executar_benchmark({
+        "geracao": (lambda qtd_dados: qtd_dados, consumir_blocos),
+        "salvamento_mysql": (gerar_dados_em_blocos, salvar_no_banco),
+    }, ranges, aquecimento, repeticoes)
+
+    geracao = benchmark.por_etapa(relatorio, "geracao")
+    salvamento = benchmark.por_etapa(relatorio, "salvamento_mysql")
+    desempenho = [
+        (
+            qtd_dados,
+            geracao[qtd_dados]["mediana"],
+            salvamento[qtd_dados]["mediana"],
+            salvamento[qtd_dados]["memoria_mb"],
+            max(geracao[qtd_dados]["memoria_max_mb"], salvamento[qtd_dados]["memoria_max_mb"])
+        )
+        for qtd_dados in ranges if qtd_dados in geracao and qtd_dados in salvamento
+    ]
+    if desempenho:
+        gerar_graficos(desempenho)
+
+def iniciar_perfil(ranges=(10000, 100000, 500000), top_n=10):
+    """Perfila geração e salvamento por etapa e grava o JSON em perfis/."""
+    perfil = profiling.PerfilEtapas(top_n=top_n)
     for qtd_dados in ranges:
-        print(f"\n🔄 Gerando {qtd_dados} dados...")
-        inicio_geracao = time.time()
-        dados = gerar_dados(qtd_dados)
-        fim_geracao = time.time()
-        
-        print(f"💾 Salvando {qtd_dados} dados no banco...")
-        inicio_salvamento = time.time()
-        salvar_no_banco(dados)
-        fim_salvamento = time.time()
-        
-        tempo_geracao = fim_geracao - inicio_geracao
-        tempo_salvamento = fim_salvamento - inicio_salvamento
-        mem_usada = medir_memoria()
-        mem_max = medir_memoria_maxima()
-        
-        desempenho.append((qtd_dados, tempo_geracao, tempo_salvamento, mem_usada, mem_max))
-        print(f"✅ {qtd_dados} dados | Geração: {tempo_geracao:.2f}s | Salvamento: {tempo_salvamento:.2f}s | Memória: {mem_usada:.2f} MB | Máx: {mem_max:.2f} MB")
-    
+        with perfil.etapa("geracao", qtd_dados=qtd_dados):
+            consumir_blocos(qtd_dados)
+        with perfil.etapa("salvamento_mysql", qtd_dados=qtd_dados):
+            salvar_no_banco(gerar_dados_em_blocos(qtd_dados))
+
+    caminho = perfil.salvar(os.path.join(profiling.PASTA_PERFIS, "sensor_simulation_algas.json"))
+    print(f"💾 Perfil salvo em {caminho}")
+    profiling.imprimir_alocacoes(perfil.resultados)
+
+    geracao = {
+        qtd_dados: (tempo, pico)
+        for qtd_dados, tempo, pico in profiling.tabela(perfil.resultados, "geracao", "tempo_s", "pico_mb")
+    }
+    desempenho = [
+        (qtd_dados, geracao[qtd_dados][0], tempo, rss, max(pico, geracao[qtd_dados][1]))
+        for qtd_dados, tempo, rss, pico in profiling.tabela(perfil.resultados, "salvamento_mysql", "tempo_s", "rss_fim_mb", "pico_mb")
+    ]
     gerar_graficos(desempenho)
 
 if __name__ == "__main__":
-    iniciar_teste()
\ No newline at end of file
+    if sys.argv[1:] == ["perfil"]:
+        iniciar_perfil()
+    else:
+        iniciar_teste()
\ No newline at end of file
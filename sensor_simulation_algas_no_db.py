@@ -1,37 +1,57 @@
 import numpy as np
-import time
-import tracemalloc
-import psutil
 import matplotlib.pyplot as plt
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+import copy
 import multiprocessing
+import os
+import sys
+import benchmark
+import profiling
 
-class Sensor:
-    def __init__(self, nome, valor_inicial):
-        self.nome = nome
-        self.valor = valor_inicial
+class SensorPasseioAleatorio:
+    """Passeio aleatório gaussiano sem limites: valor += normal(MEDIA, DESVIO)."""
 
-    def medir(self):
-        self.valor = round(self.valor + np.random.normal(-0.5, 0.5), 2)
-        return self.valor
+    __slots__ = ("nome", "valor")
+    MEDIA = 0.0
+    DESVIO = 1.0
 
-class SensorUmidadeCaotico:
     def __init__(self, nome, valor_inicial):
         self.nome = nome
         self.valor = valor_inicial
 
-    def medir(self):
-        self.valor = round(self.valor + np.random.normal(-20, 20), 2)
+    def medir(self, rng=np.random):
+        self.valor = round(self.valor + rng.normal(self.MEDIA, self.DESVIO), 2)
         return self.valor
 
-class SensorVentoSuperEstavel:
-    def __init__(self, nome, valor_inicial):
-        self.nome = nome
-        self.valor = valor_inicial
-
-    def medir(self):
-        self.valor = round(self.valor + np.random.normal(-0.001, 0.001), 2)
-        return self.valor
+    def medir_lote(self, n, rng=np.random):
+        """Gera n medições de uma vez, com a mesma série de n chamadas a `medir`.
+
+        Como `medir` arredonda o valor a cada passo, cada incremento é
+        arredondado antes da soma acumulada (o valor inicial entra no primeiro).
+        """
+        passos = rng.normal(self.MEDIA, self.DESVIO, n)
+        if not n:
+            return passos
+        passos[0] += self.valor
+        valores = np.round(np.cumsum(np.round(passos, 2)), 2)
+        self.valor = float(valores[-1])
+        return valores
+
+class Sensor(SensorPasseioAleatorio):
+    __slots__ = ()
+    MEDIA = -0.5
+    DESVIO = 0.5
+
+class SensorUmidadeCaotico(SensorPasseioAleatorio):
+    __slots__ = ()
+    MEDIA = -20
+    DESVIO = 20
+
+class SensorVentoSuperEstavel(SensorPasseioAleatorio):
+    __slots__ = ()
+    MEDIA = -0.001
+    DESVIO = 0.001
 
 sensors = [
     Sensor("temperatura", 25.0),
@@ -42,32 +62,92 @@ sensors = [
     Sensor("qualidade_ar", 8.0)
 ]
 
-def medir_memoria():
-    return psutil.Process().memory_info().rss / (1024 * 1024)
-
-def medir_memoria_maxima():
-    return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
-
 def gerar_dados_paralelo(qtd_dados, num_threads=None):
+    """Gera `qtd_dados` linhas com uma tarefa por sensor.
+
+    Cada sensor é avançado por uma só thread, então nenhum estado é
+    disputado entre threads e cada coluna continua a série do sensor.
+    """
     if num_threads is None:
         num_threads = multiprocessing.cpu_count()
 
-    parte = qtd_dados // num_threads
-    resto = qtd_dados % num_threads
-    tamanhos_partes = [parte] * num_threads
-    for i in range(resto):
-        tamanhos_partes[i] += 1
-
-    def tarefa(qtd):
-        return [tuple(sensor.medir() for sensor in sensors) for _ in range(qtd)]
-
-    dados = []
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futuros = [executor.submit(tarefa, qtd) for qtd in tamanhos_partes]
-        for futuro in as_completed(futuros):
-            dados.extend(futuro.result())
-
-    return dados
+    with ThreadPoolExecutor(max_workers=max(1, min(num_threads, len(sensors)))) as executor:
+        colunas = list(executor.map(lambda sensor: sensor.medir_lote(qtd_dados).tolist(), sensors))
+
+    return list(zip(*colunas))
+
+def _gerar_fatia(nome_memoria, formato, inicio, fim, semente, tamanho_bloco=100000):
+    """Preenche as linhas [inicio, fim) do buffer compartilhado com sensores e RNG próprios."""
+    memoria = shared_memory.SharedMemory(name=nome_memoria)
+    try:
+        saida = np.ndarray(formato, dtype=np.float64, buffer=memoria.buf)
+        rng = np.random.default_rng(semente)
+        sensores_fatia = copy.deepcopy(sensors)
+        for bloco in range(inicio, fim, tamanho_bloco):
+            fim_bloco = min(bloco + tamanho_bloco, fim)
+            for coluna, sensor in enumerate(sensores_fatia):
+                saida[bloco:fim_bloco, coluna] = sensor.medir_lote(fim_bloco - bloco, rng)
+    finally:
+        memoria.close()
+
+def gerar_dados_multiprocesso(qtd_dados, num_processos=None, semente=None):
+    """Gera os dados em processos separados, sem disputar o GIL.
+
+    Cada fatia tem sua própria cópia dos sensores e seu próprio gerador
+    (derivado de `semente`) e escreve direto num buffer em memória
+    compartilhada, em vez de devolver listas de tuplas por pickle.
+    Retorna um array (qtd_dados, len(sensors)).
+    """
+    if num_processos is None:
+        num_processos = multiprocessing.cpu_count()
+
+    formato = (qtd_dados, len(sensors))
+    memoria = shared_memory.SharedMemory(create=True, size=max(1, qtd_dados * len(sensors) * 8))
+    try:
+        limites = np.linspace(0, qtd_dados, num_processos + 1).astype(int)
+        sementes = np.random.SeedSequence(semente).spawn(num_processos)
+
+        with ProcessPoolExecutor(max_workers=num_processos) as executor:
+            futuros = [
+                executor.submit(_gerar_fatia, memoria.name, formato, limites[i], limites[i + 1], sementes[i])
+                for i in range(num_processos)
+            ]
+            for futuro in futuros:
+                futuro.result()
+
+        return np.ndarray(formato, dtype=np.float64, buffer=memoria.buf).copy()
+    finally:
+        memoria.close()
+        memoria.unlink()
+
+def medir_escalabilidade(qtd_dados, lista_processos=None, aquecimento=1, repeticoes=3):
+    """Mede speedup e eficiência paralela de `gerar_dados_multiprocesso`.
+
+    A base é uma execução medida com 1 processo (incluída se faltar em
+    `lista_processos`); cada ponto é a mediana de `repeticoes` execuções.
+    """
+    if lista_processos is None:
+        lista_processos = [2, 4, multiprocessing.cpu_count()]
+    lista_processos = sorted(set(lista_processos) | {1})
+
+    resultados = []
+    tempo_base = None
+    for num_processos in lista_processos:
+        medicao = benchmark.medir_etapa(
+            f"geracao_{num_processos}_processos",
+            lambda qtd: qtd,
+            lambda qtd: gerar_dados_multiprocesso(qtd, num_processos),
+            qtd_dados, aquecimento, repeticoes
+        )
+        tempo = medicao["mediana"]
+        if num_processos == 1:
+            tempo_base = tempo
+        speedup = tempo_base / tempo
+        eficiencia = speedup / num_processos
+        resultados.append((num_processos, tempo, speedup, eficiencia))
+        print(f"⚙️  {num_processos} processos | {tempo:.2f}s | Speedup: {speedup:.2f}x | Eficiência: {eficiencia:.0%}")
+
+    return resultados
 
 def gerar_graficos(desempenho):
     qtd_dados, tempos, mem_usada, mem_max = zip(*desempenho)
@@ -102,24 +182,33 @@ def gerar_graficos(desempenho):
     plt.savefig("grafico_desempenho.png")
     plt.show()
 
-def iniciar_teste():
-    tracemalloc.start()
-    ranges = [10, 100, 1000, 10000, 100000, 500000, 500000, 500000]
-    desempenho = []
-
+def iniciar_teste(aquecimento=1, repeticoes=3):
+    ranges = [10, 100, 1000, 10000, 100000, 500000]
+    relatorio = benchmark.executar_benchmark({
+        "geracao": (lambda qtd_dados: qtd_dados, gerar_dados_paralelo),
+    }, ranges, aquecimento, repeticoes)
+
+    desempenho = [
+        (qtd_dados, r["mediana"], r["memoria_mb"], r["memoria_max_mb"])
+        for qtd_dados, r in benchmark.por_etapa(relatorio, "geracao").items()
+    ]
+    if desempenho:
+        gerar_graficos(desempenho)
+
+def iniciar_perfil(ranges=(10000, 100000, 500000), top_n=10):
+    """Perfila a geração por quantidade e grava o JSON em perfis/."""
+    perfil = profiling.PerfilEtapas(top_n=top_n)
     for qtd_dados in ranges:
-        print(f"\n🔄 Gerando {qtd_dados} dados com threads...")
-        inicio = time.time()
-        gerar_dados_paralelo(qtd_dados)
-        fim_total = time.time()
-
-        mem_usada = medir_memoria()
-        mem_max = medir_memoria_maxima()
-        tempo_execucao = fim_total - inicio
-        desempenho.append((qtd_dados, tempo_execucao, mem_usada, mem_max))
-        print(f"✅ {qtd_dados} dados processados em {tempo_execucao:.2f}s, Memória: {mem_usada:.2f} MB, Máxima: {mem_max:.2f} MB")
+        with perfil.etapa("geracao", qtd_dados=qtd_dados):
+            gerar_dados_paralelo(qtd_dados)
 
-    gerar_graficos(desempenho)
+    caminho = perfil.salvar(os.path.join(profiling.PASTA_PERFIS, "sensor_simulation_algas_no_db.json"))
+    print(f"💾 Perfil salvo em {caminho}")
+    profiling.imprimir_alocacoes(perfil.resultados)
+    gerar_graficos(profiling.tabela(perfil.resultados, "geracao", "tempo_s", "rss_fim_mb", "pico_mb"))
 
 if __name__ == "__main__":
-    iniciar_teste()
+    if sys.argv[1:] == ["perfil"]:
+        iniciar_perfil()
+    else:
+        iniciar_teste()
@@ -1,53 +1,88 @@
 import numpy as np
-import time
-import tracemalloc
-import psutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import multiprocessing
 import datetime
 import json
 import boto3
 import os
+import io
+import gzip
+import sys
+import benchmark
+import profiling
+from iot_sensor_simulation.edge_reduction import DeadbandReducer
 
-s3 = boto3.client('s3')
+# S3_ENDPOINT_URL aponta para um S3 local (MinIO, moto) nos testes
+s3 = boto3.client('s3', endpoint_url=os.environ.get("S3_ENDPOINT_URL"))
 s3_name = 'eco-firewatch-raw'
 
-class Sensor:
+class SensorPasseioAleatorio:
+    """Passeio aleatório gaussiano sem limites: valor += normal(MEDIA, DESVIO)."""
+
+    __slots__ = ("nome", "valor")
+    MEDIA = 0.0
+    DESVIO = 1.0
+
     def __init__(self, nome, valor_inicial):
         self.nome = nome
         self.valor = valor_inicial
 
-    def medir(self):
-        self.valor = round(self.valor + np.random.normal(-0.5, 0.5), 2)
+    def medir(self, rng=np.random):
+        self.valor = round(self.valor + rng.normal(self.MEDIA, self.DESVIO), 2)
         return self.valor
 
+    def medir_lote(self, n, rng=np.random):
+        """Gera n medições de uma vez, com a mesma série de n chamadas a `medir`.
+
+        Como `medir` arredonda o valor a cada passo, cada incremento é
+        arredondado antes da soma acumulada (o valor inicial entra no primeiro).
+        """
+        passos = rng.normal(self.MEDIA, self.DESVIO, n)
+        if not n:
+            return passos
+        passos[0] += self.valor
+        valores = np.round(np.cumsum(np.round(passos, 2)), 2)
+        self.valor = float(valores[-1])
+        return valores
+
+class Sensor(SensorPasseioAleatorio):
+    __slots__ = ()
+    MEDIA = -0.5
+    DESVIO = 0.5
+
 class SensorDirecaoVento:
+    __slots__ = ("nome", "valor")
+
     def __init__(self, nome, valor_inicial):
         self.nome = nome
         self.valor = valor_inicial
 
-    def medir(self):
-        self.valor = round(self.valor + np.random.uniform(-1,1)) % 360
+    def medir(self, rng=np.random):
+        self.valor = round(self.valor + rng.uniform(-1,1)) % 360
         if self.valor < 0:
             self.valor = 360 - self.valor
         return self.valor
-class SensorUmidadeCaotico:
-    def __init__(self, nome, valor_inicial):
-        self.nome = nome
-        self.valor = valor_inicial
 
-    def medir(self):
-        self.valor = round(self.valor + np.random.normal(-20, 20), 2)
-        return self.valor
+    def medir_lote(self, n, rng=np.random):
+        """Mesma série de n chamadas a `medir`: o valor é arredondado a cada
+        passo, então cada passo soma -1, 0 ou +1 grau (e não um uniforme contínuo)."""
+        passos = rng.uniform(-1, 1, n)
+        if not n:
+            return passos
+        passos[0] += self.valor
+        valores = np.mod(np.cumsum(np.round(passos)), 360)
+        self.valor = float(valores[-1])
+        return valores
 
-class SensorVentoSuperEstavel:
-    def __init__(self, nome, valor_inicial):
-        self.nome = nome
-        self.valor = valor_inicial
+class SensorUmidadeCaotico(SensorPasseioAleatorio):
+    __slots__ = ()
+    MEDIA = -20
+    DESVIO = 20
 
-    def medir(self):
-        self.valor = round(self.valor + np.random.normal(-0.001, 0.001), 2)
-        return self.valor
+class SensorVentoSuperEstavel(SensorPasseioAleatorio):
+    __slots__ = ()
+    MEDIA = -0.001
+    DESVIO = 0.001
 
 sensors = [
     Sensor("temperatura", 25.0),
@@ -59,32 +94,19 @@ sensors = [
     SensorDirecaoVento("vento_direcao", 0.0)
 ]
 
-def medir_memoria():
-    return psutil.Process().memory_info().rss / (1024 * 1024)
-
-def medir_memoria_maxima():
-    return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
-
 def gerar_dados_paralelo(qtd_dados, num_threads=None):
+    """Gera `qtd_dados` linhas com uma tarefa por sensor.
+
+    Cada sensor é avançado por uma só thread, então nenhum estado é
+    disputado entre threads e cada coluna continua a série do sensor.
+    """
     if num_threads is None:
         num_threads = multiprocessing.cpu_count()
 
-    parte = qtd_dados // num_threads
-    resto = qtd_dados % num_threads
-    tamanhos_partes = [parte] * num_threads
-    for i in range(resto):
-        tamanhos_partes[i] += 1
-
-    def tarefa(qtd):
-        return [tuple(sensor.medir() for sensor in sensors) for _ in range(qtd)]
+    with ThreadPoolExecutor(max_workers=max(1, min(num_threads, len(sensors)))) as executor:
+        colunas = list(executor.map(lambda sensor: sensor.medir_lote(qtd_dados).tolist(), sensors))
 
-    dados = []
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futuros = [executor.submit(tarefa, qtd) for qtd in tamanhos_partes]
-        for futuro in as_completed(futuros):
-            dados.extend(futuro.result())
-
-    return dados
+    return list(zip(*colunas))
 
 def data_to_json(data):
     json_string = []
@@ -102,37 +124,209 @@ def data_to_json(data):
 
     return json.dumps(json_string)
 
-def iniciar_teste():
-    tracemalloc.start()
-    ranges = [10, 100, 1000]
-    # 10000, 100000, 500000, 500000, 500000]
-    desempenho = []
+def enviar_para_s3(data):
+    file = f"{datetime.datetime.now().isoformat()}.json"
 
-    for qtd_dados in ranges:
-        print(f"\n🔄 Gerando {qtd_dados} dados com threads...")
-        inicio = time.time()
-        data = gerar_dados_paralelo(qtd_dados)
-        data = data_to_json(data)
-        fim_total = time.time()
+    with open(file, "w") as f:
+        f.write(data)
 
-        file = f"{datetime.datetime.now().isoformat()}.json"
+    s3.upload_file(file, s3_name, f"data/{file}")
 
-        with open(file, "w") as f:
-            f.write(data)
+    if os.path.exists(file):
+        os.remove(file)
+        print("Arquivo apagado com sucesso!")
 
-        s3.upload_file(file, s3_name, f"data/{file}")
+# ---------------------- Envio em streaming ----------------------
+TAMANHO_MINIMO_PARTE = 5 * 1024 * 1024
+
+# Mesmos campos e ordem de `data_to_json`; o índice é a coluna em `sensors`
+CAMPOS_NDJSON = [
+    ("temperatura", 0),
+    ("airHumidity", 1),
+    ("airSoil", 2),
+    ("co2", 4),
+    ("airQuality", 5),
+    ("windSpeed", 3),
+    ("windDirection", 6),
+]
+MODELO_LINHA_NDJSON = "{" + ", ".join(f'"{campo}": %r' for campo, _ in CAMPOS_NDJSON) + ', "insertDate": "%s"}\n'
 
-        if os.path.exists(file):
-            os.remove(file)
-            print("Arquivo apagado com sucesso!")
+class UploadMultipartS3:
+    """Arquivo só de escrita que vai para o S3 em partes de `tamanho_parte` bytes.
 
+    Guarda em memória no máximo uma parte (mais a última escrita). Se o total
+    não chegar a uma parte, envia com um único put_object. Em caso de erro a
+    multipart é abortada para não deixar partes órfãs no bucket.
+    """
 
-        mem_usada = medir_memoria()
-        mem_max = medir_memoria_maxima()
-        tempo_execucao = fim_total - inicio
-        desempenho.append((qtd_dados, tempo_execucao, mem_usada, mem_max))
-        print(f"✅ {qtd_dados} dados processados em {tempo_execucao:.2f}s, Memória: {mem_usada:.2f} MB, Máxima: {mem_max:.2f} MB")
+    def __init__(self, cliente, bucket, chave, tamanho_parte=8 * 1024 * 1024, **extra):
+        if tamanho_parte < TAMANHO_MINIMO_PARTE:
+            raise ValueError("O S3 exige partes de pelo menos 5 MB")
+        self.cliente = cliente
+        self.bucket = bucket
+        self.chave = chave
+        self.tamanho_parte = tamanho_parte
+        self.extra = extra
+        self.buffer = io.BytesIO()
+        self.upload_id = None
+        self.partes = []
+        self.bytes_enviados = 0
+
+    def write(self, dados):
+        self.buffer.write(dados)
+        if self.buffer.tell() >= self.tamanho_parte:
+            self._enviar_parte()
+        return len(dados)
+
+    def _enviar_parte(self):
+        if self.upload_id is None:
+            self.upload_id = self.cliente.create_multipart_upload(
+                Bucket=self.bucket, Key=self.chave, **self.extra
+            )["UploadId"]
+        corpo = self.buffer.getvalue()
+        numero = len(self.partes) + 1
+        resposta = self.cliente.upload_part(
+            Bucket=self.bucket, Key=self.chave, UploadId=self.upload_id, PartNumber=numero, Body=corpo
+        )
+        self.partes.append({"PartNumber": numero, "ETag": resposta["ETag"]})
+        self.bytes_enviados += len(corpo)
+        self.buffer = io.BytesIO()
+
+    def close(self):
+        if self.upload_id is None:
+            corpo = self.buffer.getvalue()
+            self.cliente.put_object(Bucket=self.bucket, Key=self.chave, Body=corpo, **self.extra)
+            self.bytes_enviados += len(corpo)
+        else:
+            if self.buffer.tell():
+                self._enviar_parte()
+            self.cliente.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.chave, UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.partes}
+            )
+        self.buffer = io.BytesIO()
+
+    def abortar(self):
+        if self.upload_id is not None:
+            self.cliente.abort_multipart_upload(Bucket=self.bucket, Key=self.chave, UploadId=self.upload_id)
+        self.buffer = io.BytesIO()
+
+# O gerador antigo chamava datetime.now() a cada linha, então cada leitura
+# tinha o próprio insertDate; 1 µs é o menor passo que mantém isso
+INTERVALO_LEITURAS_US = 1
+
+def gerar_timestamps(qtd, inicio=None, intervalo_us=INTERVALO_LEITURAS_US):
+    """Gera `qtd` timestamps ISO de uma vez, a partir de `inicio` (agora por padrão), `intervalo_us` entre eles."""
+    if inicio is None:
+        inicio = datetime.datetime.now()
+    base = np.datetime64(inicio, "us")
+    return np.datetime_as_string(base + np.arange(qtd) * np.timedelta64(intervalo_us, "us"), unit="us")
+
+def gerar_blocos_colunas(qtd_dados, tamanho_bloco=50000):
+    """Gera os dados em blocos de colunas (uma lista por sensor), um bloco por vez."""
+    for inicio in range(0, qtd_dados, tamanho_bloco):
+        qtd = min(tamanho_bloco, qtd_dados - inicio)
+        yield [sensor.medir_lote(qtd).tolist() for sensor in sensors]
+
+def bloco_para_ndjson(colunas, timestamps, mascara=None):
+    """Serializa um bloco de colunas como NDJSON, uma leitura por linha.
+
+    Com `mascara` (linhas x sensores, do deadband), só os campos marcados
+    entram em cada linha, e linhas sem nenhum campo são puladas.
+    """
+    valores = [colunas[indice] for _, indice in CAMPOS_NDJSON]
+    if mascara is None:
+        return "".join(MODELO_LINHA_NDJSON % linha for linha in zip(*valores, timestamps.tolist())).encode()
+
+    linhas = []
+    for i in np.flatnonzero(mascara.any(axis=1)).tolist():
+        leitura = {campo: colunas[indice][i] for campo, indice in CAMPOS_NDJSON if mascara[i, indice]}
+        leitura["insertDate"] = str(timestamps[i])
+        linhas.append(json.dumps(leitura) + "\n")
+    return "".join(linhas).encode()
+
+def enviar_stream_para_s3(qtd_dados, comprimir=False, tamanho_bloco=50000,
+                          tamanho_parte=8 * 1024 * 1024, cliente=None, bucket=None, chave=None,
+                          deadband=None):
+    """Gera, serializa e envia `qtd_dados` leituras em NDJSON direto para o S3.
+
+    Nada passa pelo disco: cada bloco é serializado e escrito numa multipart
+    upload (com gzip opcional), então a memória depende só de `tamanho_parte`
+    e `tamanho_bloco`, não de `qtd_dados`. Com `deadband`, cada sensor só é
+    enviado quando varia mais que esse valor. Retorna a chave do objeto.
+    """
+    cliente = cliente or s3
+    bucket = bucket or s3_name
+    if chave is None:
+        chave = f"data/{datetime.datetime.now().isoformat()}.ndjson" + (".gz" if comprimir else "")
+
+    extra = {"ContentType": "application/x-ndjson"}
+    if comprimir:
+        extra["ContentEncoding"] = "gzip"
+    upload = UploadMultipartS3(cliente, bucket, chave, tamanho_parte, **extra)
+    saida = gzip.GzipFile(fileobj=upload, mode="wb") if comprimir else upload
+    # A direção do vento é angular: 359° -> 1° é uma mudança de 2°
+    direcao = [indice for indice, sensor in enumerate(sensors) if isinstance(sensor, SensorDirecaoVento)]
+    redutor = DeadbandReducer(deadband, wrap=direcao) if deadband is not None else None
+
+    # Relógio simulado: cada bloco continua de onde o anterior parou
+    inicio = datetime.datetime.now()
+    emitidas = 0
+
+    try:
+        for colunas in gerar_blocos_colunas(qtd_dados, tamanho_bloco):
+            mascara = redutor.reduce(np.column_stack(colunas)) if redutor else None
+            qtd = len(colunas[0])
+            timestamps = gerar_timestamps(qtd, inicio + datetime.timedelta(microseconds=emitidas * INTERVALO_LEITURAS_US))
+            emitidas += qtd
+            saida.write(bloco_para_ndjson(colunas, timestamps, mascara))
+        if comprimir:
+            saida.close()
+        upload.close()
+    except Exception:
+        upload.abortar()
+        raise
+
+    print(f"☁️  {qtd_dados} dados enviados para s3://{bucket}/{chave} ({upload.bytes_enviados / (1024 * 1024):.2f} MB, {len(upload.partes) or 1} parte(s))")
+    if redutor:
+        redutor.report()
+    return chave
+
+def gerar_colunas(qtd_dados):
+    return list(zip(*gerar_dados_paralelo(qtd_dados)))
+
+def iniciar_teste(aquecimento=1, repeticoes=3):
+    ranges = [10, 100, 1000]
+    # 10000, 100000, 500000]
+    benchmark.executar_benchmark({
+        "geracao": (lambda qtd_dados: qtd_dados, gerar_dados_paralelo),
+        "serializacao": (gerar_colunas, data_to_json),
+        "upload_s3": (lambda qtd_dados: data_to_json(gerar_colunas(qtd_dados)), enviar_para_s3),
+        "upload_s3_stream": (lambda qtd_dados: qtd_dados, enviar_stream_para_s3),
+    }, ranges, aquecimento, repeticoes)
+
+
+def iniciar_perfil(ranges=(10000, 100000, 500000), top_n=10):
+    """Perfila geração, serialização e envio por etapa e grava o JSON em perfis/."""
+    perfil = profiling.PerfilEtapas(top_n=top_n)
+    for qtd_dados in ranges:
+        with perfil.etapa("geracao", qtd_dados=qtd_dados):
+            colunas = gerar_colunas(qtd_dados)
+        with perfil.etapa("serializacao", qtd_dados=qtd_dados):
+            conteudo = data_to_json(colunas)
+        del colunas
+        with perfil.etapa("upload_s3", qtd_dados=qtd_dados):
+            enviar_para_s3(conteudo)
+        del conteudo
+        with perfil.etapa("upload_s3_stream", qtd_dados=qtd_dados):
+            enviar_stream_para_s3(qtd_dados)
 
+    caminho = perfil.salvar(os.path.join(profiling.PASTA_PERFIS, "sensor_simulation_algas_to_bucket.json"))
+    print(f"💾 Perfil salvo em {caminho}")
+    profiling.imprimir_alocacoes(perfil.resultados)
 
 if __name__ == "__main__":
-    iniciar_teste()
+    if sys.argv[1:] == ["perfil"]:
+        iniciar_perfil()
+    else:
+        iniciar_teste()
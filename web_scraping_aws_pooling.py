@@ -1,7 +1,13 @@
+import os
 import time
 import boto3
+from botocore.config import Config
 import gspread
 from google.oauth2.service_account import Credentials
+from listagem_s3 import ListagemIncremental
+from eventos_s3 import consumir_eventos, criar_cliente_sqs
+from escritor_sheets import EscritorSheets, FilaSheets, abrir_aba_gspread
+from busca_s3 import BuscaConcorrente
 import csv
 from io import StringIO
 
@@ -12,6 +18,20 @@ AWS_SESSION_TOKEN = 'leandro'
 BUCKET_NAME = 'leandro-tokudome'
 PREFIX = ''
 POLL_INTERVAL = 60
+ARQUIVO_ESTADO = 'web_scraping_aws_pooling_estado.sqlite3'
+VARREDURA_A_CADA = 60
+# Com a URL de uma fila SQS que recebe os eventos ObjectCreated do bucket,
+# roda no modo por eventos; a listagem vira varredura de reconciliação
+FILA_EVENTOS_URL = os.environ.get('FILA_EVENTOS_URL', '')
+INTERVALO_RECONCILIACAO = 900
+# Mensagens que falham MAX_RECEBIMENTOS vezes vão para esta fila (ou são descartadas)
+FILA_FALHAS_URL = os.environ.get('FILA_FALHAS_URL')
+MAX_RECEBIMENTOS = 5
+# Escritas no Sheets passam por uma fila compartilhada entre os pollers
+ARQUIVO_FILA_SHEETS = os.environ.get('FILA_SHEETS', 'fila_sheets.sqlite3')
+# Recuperação de atraso: downloads em paralelo com teto de memória
+DOWNLOADS_SIMULTANEOS = 8
+LIMITE_BYTES_EM_MEMORIA = 64 * 1024 * 1024
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 SERVICE_ACCOUNT_FILE = r'C:\Users\akiot\OneDrive\Área de Trabalho\Pasta\SpTech\aulaCesar\ecofirewatch-0089310b8142.json'
@@ -20,20 +40,21 @@ WORKSHEET_NAME = 'Webscrapping'
 
 credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
 gc = gspread.authorize(credentials)
-sheet = gc.open_by_key(SPREADSHEET_ID).worksheet(WORKSHEET_NAME)
+fila_sheets = FilaSheets(ARQUIVO_FILA_SHEETS)
+escritor_sheets = EscritorSheets(fila_sheets, abrir_aba_gspread(gc))
 
 s3 = boto3.client(
     's3',
     aws_access_key_id=AWS_ACCESS_KEY_ID,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    aws_session_token=AWS_SESSION_TOKEN
+    aws_session_token=AWS_SESSION_TOKEN,
+    config=Config(max_pool_connections=DOWNLOADS_SIMULTANEOS)
 )
 
 def listar_arquivos_s3():
-    response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=PREFIX)
-    if 'Contents' in response:
-        return [obj['Key'] for obj in response['Contents']]
-    return []
+    # Pagina até o fim: list_objects_v2 devolve no máximo 1000 chaves por chamada
+    paginas = s3.get_paginator('list_objects_v2').paginate(Bucket=BUCKET_NAME, Prefix=PREFIX)
+    return [obj['Key'] for pagina in paginas for obj in pagina.get('Contents', [])]
 
 def baixar_arquivo_s3(key):
     response = s3.get_object(Bucket=BUCKET_NAME, Key=key)
@@ -44,30 +65,72 @@ def processar_e_enviar_para_sheets(conteudo_arquivo):
     leitor = csv.reader(f)
     linhas = list(leitor)
     
-    sheet.clear()
-    
-    sheet.update('A1', linhas)
-    
-    print("Dados substituídos no Google Sheets com sucesso.")
+    # Reescreve só as linhas que mudaram em relação ao que está na aba
+    fila_sheets.substituir(SPREADSHEET_ID, WORKSHEET_NAME, linhas)
+
+    print("Dados enfileirados para substituição no Google Sheets.")
+
 
+def processar_arquivo(listagem, arquivo, conteudo=None):
+    print(f'Novo arquivo detectado: {arquivo}')
+    if conteudo is None:
+        conteudo = baixar_arquivo_s3(arquivo)
+    processar_e_enviar_para_sheets(conteudo)
+    listagem.marcar_processado(arquivo)
 
 def main():
-    arquivos_vistos = set()
+    listagem = ListagemIncremental(s3, BUCKET_NAME, PREFIX, ARQUIVO_ESTADO)
+    busca = BuscaConcorrente(s3, BUCKET_NAME, DOWNLOADS_SIMULTANEOS, LIMITE_BYTES_EM_MEMORIA)
+    ciclo = 0
     while True:
         try:
-            arquivos = listar_arquivos_s3()
-            novos = [a for a in arquivos if a not in arquivos_vistos]
+            # A cada VARREDURA_A_CADA ciclos, reconcilia listando o bucket inteiro
+            ciclo += 1
+            if ciclo % VARREDURA_A_CADA == 0:
+                novos = listagem.varredura_completa()
+            else:
+                novos = listagem.novos()
 
-            for arquivo in novos:
-                print(f'Novo arquivo detectado: {arquivo}')
-                conteudo = baixar_arquivo_s3(arquivo)
-                processar_e_enviar_para_sheets(conteudo)
-                arquivos_vistos.add(arquivo)
+            # Downloads em paralelo, processamento na ordem das chaves
+            for arquivo, partes in busca.buscar(novos):
+                processar_arquivo(listagem, arquivo, b''.join(partes).decode('utf-8'))
 
             time.sleep(POLL_INTERVAL)
         except Exception as e:
             print(f'Erro: {e}')
             time.sleep(POLL_INTERVAL)
 
+def main_eventos():
+    listagem = ListagemIncremental(s3, BUCKET_NAME, PREFIX, ARQUIVO_ESTADO)
+    sqs = criar_cliente_sqs(
+        FILA_EVENTOS_URL,
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        aws_session_token=AWS_SESSION_TOKEN
+    )
+
+    def tratar(bucket, chave):
+        # Notificações podem chegar repetidas (entrega at-least-once)
+        if bucket != BUCKET_NAME or not chave.startswith(PREFIX) or listagem.ja_processado(chave):
+            return
+        processar_arquivo(listagem, chave)
+
+    def reconciliar():
+        for arquivo in listagem.varredura_completa():
+            processar_arquivo(listagem, arquivo)
+
+    consumir_eventos(
+        sqs, FILA_EVENTOS_URL, tratar, reconciliar, INTERVALO_RECONCILIACAO,
+        max_recebimentos=MAX_RECEBIMENTOS, url_fila_falhas=FILA_FALHAS_URL
+    )
+
 if __name__ == "__main__":
-    main()
+    escritor_sheets.iniciar()
+    try:
+        if FILA_EVENTOS_URL:
+            main_eventos()
+        else:
+            main()
+    finally:
+        # Descarrega o que ficou na fila e libera o lock para outro poller escrever
+        escritor_sheets.parar()